@@ -0,0 +1,70 @@
+"""Size and encode time of each ticket image format, plus on-demand cache hits.
+
+Usage (from the repository root):
+    python benchmarks/bench_encodings.py [--tickets 10]
+
+For every format in ticket_render.IMAGE_FORMATS: median encoded size and
+encode time, and whether the QR still reads after scaling the ticket down
+to phone-screen size (needs opencv-python, skipped otherwise).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ticket_render import IMAGE_FORMATS, clear_asset_cache, encode_ticket, render_ticket, ticket_image_bytes
+from ticket_tokens import compact_token
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def _reads(data, token):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    image = cv2.resize(image, None, fx=0.3, fy=0.3, interpolation=cv2.INTER_AREA)
+    return cv2.QRCodeDetector().detectAndDecode(image)[0] == token
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=10)
+    args = parser.parse_args()
+
+    for event_type in ("Independencia", "Dia de Muertos"):
+        tokens = [compact_token(f"{event_type}-{i}") for i in range(args.tickets)]
+        images = [render_ticket(token, event_type, 2, 1, f"Invitado {i}") for i, token in enumerate(tokens)]
+        print(event_type)
+        for fmt in IMAGE_FORMATS:
+            encode_ticket(images[0], event_type, fmt)  # per-event palette is fitted once
+            sizes, samples, reads = [], [], 0
+            for token, image in zip(tokens, images):
+                start = time.perf_counter()
+                data = encode_ticket(image, event_type, fmt)
+                samples.append((time.perf_counter() - start) * 1000)
+                sizes.append(len(data))
+                reads += bool(cv2 is not None and _reads(data, token))
+            line = f"  {fmt:<12} {statistics.median(sizes) / 1024:7.0f} KB  {statistics.median(samples):7.1f} ms"
+            if cv2 is not None:
+                line += f"  QR legible {reads}/{len(tokens)}"
+            print(line)
+
+    clear_asset_cache()
+    token = compact_token("cache")
+    start = time.perf_counter()
+    ticket_image_bytes(token, "Independencia", 2, 1, "Invitado")
+    miss = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    ticket_image_bytes(token, "Independencia", 2, 1, "Invitado")
+    hit = (time.perf_counter() - start) * 1000
+    print(f"Bajo demanda: primera vez {miss:.1f} ms, desde cache {hit:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Admin upload of a full tickets.csv: overwrite + re-import vs validated diff import.
+
+Usage (from the repository root):
+    python benchmarks/bench_import.py [--rows 200000] [--changed 0.01]
+
+Builds a store, then an edited copy of tickets.csv with a fraction of the
+tickets changed, the same number added and half as many removed. Times the
+old upload (overwrite the file, re-index everything) against diff_upload +
+apply_upload, and checks both end with the same tickets and aggregates.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import SEED, _synthetic_rows, write_dataset
+from ticket_import import apply_upload, diff_upload
+from ticket_store import FIELDNAMES, TicketStore, get_store
+
+
+def _edited(rows, fraction, rng):
+    count = max(1, int(len(rows) * fraction))
+    edited = [list(row) for row in rows[count // 2:]]  # first count/2 tickets removed
+    for row in rng.sample(edited, count):
+        row[8] = row[8] + " (editado)"
+    edited.extend(list(row) for row in _synthetic_rows(count, random.Random(SEED + 1)))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow(FIELDNAMES)
+    writer.writerows(edited)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _state(store):
+    return store.export_rows()[1], store.aggregates()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--changed", type=float, default=0.01, help="Fracción de tickets modificados")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    try:
+        rows = list(_synthetic_rows(args.rows, random.Random(SEED)))
+        upload = _edited(rows, args.changed, random.Random(SEED))
+
+        # Previous flow: overwrite tickets.csv, the store re-indexes it from scratch
+        old_csv = os.path.join(workdir, "old", "tickets.csv")
+        os.makedirs(os.path.dirname(old_csv))
+        write_dataset(old_csv, rows)
+        old_store = TicketStore(old_csv)
+
+        def write_upload(temp_path):
+            with open(temp_path, "wb") as f:
+                f.write(upload)
+
+        start = time.perf_counter()
+        old_store.rewrite_csv(write_upload)
+        old_seconds = time.perf_counter() - start
+
+        new_csv = os.path.join(workdir, "new", "tickets.csv")
+        os.makedirs(os.path.dirname(new_csv))
+        write_dataset(new_csv, rows)
+        new_store = get_store(new_csv)
+        start = time.perf_counter()
+        diff, errors = diff_upload(io.BytesIO(upload), new_csv)
+        diff_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        apply_upload(diff, new_csv)
+        apply_seconds = time.perf_counter() - start
+
+        print(f"{args.rows} tickets: {len(diff['added'])} nuevos, {len(diff['changed'])} modificados, "
+              f"{len(diff['removed'])} eliminados")
+        print(f"Sobrescribir y reindexar:    {old_seconds:8.2f} s")
+        print(f"Validar y calcular cambios:  {diff_seconds:8.2f} s")
+        print(f"Aplicar cambios:             {apply_seconds:8.2f} s")
+        same = sorted(_state(old_store)[0]) == sorted(_state(new_store)[0]) and _state(old_store)[1] == _state(new_store)[1]
+        print("OK: mismo resultado" if same and not errors else f"FALLO: resultados distintos {errors}")
+        if not same or errors:
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Per-ticket render latency with and without the background/font asset cache.
+
+Usage (from the repository root):
+    python benchmarks/bench_render.py [--tickets 50]
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ticket_render import clear_asset_cache, render_ticket
+
+
+def _time_renders(n, event_type, cold):
+    samples = []
+    for i in range(n):
+        token = hashlib.sha256(str(i).encode()).hexdigest()
+        if cold:
+            clear_asset_cache()
+        start = time.perf_counter()
+        render_ticket(token, event_type, 2, 1, f"Invitado {i}")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=50)
+    args = parser.parse_args()
+
+    for event_type in ("Independencia", "Dia de Muertos"):
+        cold = _time_renders(args.tickets, event_type, cold=True)
+        render_ticket("warmup", event_type, 0, 0, "")
+        warm = _time_renders(args.tickets, event_type, cold=False)
+        print(f"{event_type}: sin cache {statistics.median(cold):.1f} ms/ticket, "
+              f"con cache {statistics.median(warm):.1f} ms/ticket "
+              f"({statistics.median(cold) / statistics.median(warm):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Gate validation throughput: signed-ticket verification vs store lookups.
+
+Usage (from the repository root):
+    python benchmarks/bench_signed.py [--tickets 20000] [--scans 20000]
+
+Builds a throwaway ticket store, then times verify_signed() (HMAC only, no
+data) against TicketStore.get_by_hash() for the same number of scans.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Signed tokens are refused without a key
+os.environ.setdefault("TICKET_TOKEN_KEY", "bench-key")
+
+from ticket_issuance import ticket_row
+from ticket_store import TicketStore
+from ticket_tokens import compact_token, signed_token, verify_signed
+
+
+def _rate(fn, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        fn(token)
+    return len(tokens) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--scans", type=int, default=20000)
+    args = parser.parse_args()
+
+    token_ids = [str(uuid.uuid4()) for _ in range(args.tickets)]
+    signed = [signed_token(token_id, "Independencia", "2026-09-16", 2, 1) for token_id in token_ids]
+    compact = [compact_token(token_id) for token_id in token_ids]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TicketStore(os.path.join(tmp, "tickets.csv"))
+        store.add_tickets([
+            ticket_row(token, token_id, "Independencia", "2026-09-16", 2, 1, "", "", "", "", "")
+            for token, token_id in zip(compact, token_ids)
+        ])
+        scans = (args.scans + len(token_ids) - 1) // len(token_ids)
+        print(f"verify_signed: {_rate(verify_signed, (signed * scans)[:args.scans]):,.0f} verificaciones/s")
+        print(f"get_by_hash ({args.tickets} tickets): {_rate(store.get_by_hash, (compact * scans)[:args.scans]):,.0f} búsquedas/s")
+
+
+if __name__ == "__main__":
+    main()
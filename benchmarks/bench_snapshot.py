@@ -0,0 +1,63 @@
+"""Load time of the columnar snapshot vs parsing tickets.csv.
+
+Usage (from the repository root):
+    python benchmarks/bench_snapshot.py [--rows 1000000]
+
+Times csv.reader and pandas.read_csv over the whole file against mapping
+two columns (hashed_token, estado) and all columns of the snapshot.
+"""
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import SEED, _synthetic_rows, write_dataset
+from ticket_snapshot import load_snapshot, write_snapshot
+
+
+def _seconds(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_snapshot_")
+    try:
+        csv_file = os.path.join(workdir, "tickets.csv")
+        write_dataset(csv_file, _synthetic_rows(args.rows, random.Random(SEED)))
+        build = _seconds(lambda: write_snapshot(csv_file))
+
+        def parse_csv():
+            with open(csv_file, newline="", encoding="utf-8") as f:
+                for _ in csv.reader(f, delimiter=";"):
+                    pass
+
+        def parse_pandas():
+            import pandas as pd
+            pd.read_csv(csv_file, sep=";", dtype=str)
+
+        print(f"{args.rows} filas (instantánea creada en {build:.1f}s)")
+        print(f"csv.reader completo:        {_seconds(parse_csv) * 1000:10.1f} ms")
+        print(f"pandas.read_csv completo:   {_seconds(parse_pandas) * 1000:10.1f} ms")
+        print(f"instantánea, 2 columnas:    {_seconds(lambda: load_snapshot(csv_file, ['hashed_token', 'estado'])) * 1000:10.1f} ms")
+        print(f"instantánea, todo:          {_seconds(lambda: load_snapshot(csv_file)) * 1000:10.1f} ms")
+        snapshot = load_snapshot(csv_file, ["adults", "children", "estado"])
+        print(f"personas con check-in:      {_seconds(lambda: (snapshot['adults'] + snapshot['children'])[snapshot['estado'] == 'invalido'].sum()) * 1000:10.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
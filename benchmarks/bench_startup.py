@@ -0,0 +1,80 @@
+"""Streamlit app startup and rerun timings.
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py [--reruns 20]
+
+Reports the cold import time of ticket_generator_streamlit.py (on top of an
+already imported streamlit) in a fresh interpreter and the median time of a full script rerun for each tab, run
+through streamlit.testing in a scratch copy of the app directory.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABS = ("Generar Ticket", "Administrar tickets", "Check-in")
+
+
+def _scratch_copy():
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    for name in os.listdir(ROOT):
+        if name.endswith((".py", ".png", ".json")):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+    return workdir
+
+
+def cold_import_seconds(workdir):
+    # streamlit itself is imported first so only the app's own startup cost is measured
+    code = ("import time, streamlit; t = time.perf_counter(); import ticket_generator_streamlit; "
+            "print(time.perf_counter() - t)")
+    env = dict(os.environ, TICKETS_STORAGE_BACKEND="local")
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def rerun_seconds(workdir, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    os.environ["TICKETS_STORAGE_BACKEND"] = "local"
+    at = AppTest.from_file(os.path.join(workdir, "ticket_generator_streamlit.py"), default_timeout=120)
+    at.session_state["login_success"] = True
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    results = {"first_run": first}
+    for tab in TABS:
+        at.sidebar.radio[0].set_value(tab).run()
+        samples = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            at.run()
+            samples.append(time.perf_counter() - start)
+        results[tab] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = _scratch_copy()
+    try:
+        print(f"Importación en frío: {cold_import_seconds(workdir) * 1000:.0f} ms")
+        results = rerun_seconds(workdir, args.reruns)
+        print(f"Primera ejecución: {results.pop('first_run') * 1000:.0f} ms")
+        for tab, seconds in results.items():
+            print(f"Re-ejecución '{tab}': {seconds * 1000:.1f} ms (mediana)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
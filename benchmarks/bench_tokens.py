@@ -0,0 +1,65 @@
+"""Legacy hex vs compact "T1" QR payloads: encode time, QR version and decode rate.
+
+Usage (from the repository root):
+    python benchmarks/bench_tokens.py [--tokens 200] [--camera-px 100]
+
+Decoding uses OpenCV's QRCodeDetector when opencv-python is installed;
+otherwise the decode column is skipped.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qr_encoder import QREncoder
+from ticket_tokens import compact_token, hex_token
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def _decode_rate(encoder, tokens, camera_px):
+    detector = cv2.QRCodeDetector()
+    ok = 0
+    for token in tokens:
+        image = 255 - np.asarray(encoder.render_mask(token).convert("L"))
+        # The printed code has the same size for every format; scale it to how small a gate camera sees it
+        image = cv2.resize(image, (camera_px, camera_px), interpolation=cv2.INTER_AREA)
+        image = np.pad(image, 20, constant_values=255)
+        decoded, _, _ = detector.detectAndDecode(image)
+        ok += decoded == token
+    return ok / len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--camera-px", type=int, default=100, help="Ancho del código visto por la cámara")
+    args = parser.parse_args()
+
+    token_ids = [str(uuid.uuid4()) for _ in range(args.tokens)]
+    encoder = QREncoder(target_px=615)
+    for name, make in (("hex", hex_token), ("T1", compact_token)):
+        tokens = [make(token_id) for token_id in token_ids]
+        samples = []
+        for token in tokens:
+            start = time.perf_counter()
+            encoder.render_mask(token)
+            samples.append((time.perf_counter() - start) * 1000)
+        line = (f"{name}: {len(tokens[0])} caracteres, versión QR {encoder.version_for(tokens[0])}, "
+                f"codificación {statistics.median(samples):.2f} ms")
+        if cv2 is not None:
+            line += f", lectura {_decode_rate(encoder, tokens, args.camera_px) * 100:.1f}%"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Two-device exchange through delta sync, on the local backend and a fake Drive.
+
+Usage (from the repository root):
+    python benchmarks/check_delta_sync.py
+
+For each backend, two ticket stores share one delta folder: device A sells
+tickets and pushes them, device B pulls them, checks some in and pushes
+back. Also checks a delta file listed late (createdTime older than what B
+already pulled), that repeated pulls apply nothing and that SyncWorker runs
+the exchange in the background. Exits 1 on failure.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_drive import FakeDriveService
+from storage_backends import DriveBackend, LocalBackend
+from ticket_issuance import ticket_row
+from ticket_store import get_store
+from tickets_sync_service import SyncWorker, pull_delta, push_delta, sync_delta
+
+FOLDER = "deltas"
+
+
+def _rows(prefix, count):
+    return [ticket_row(f"{prefix}{i:04d}", f"{prefix}-id-{i}", "Independencia", "2026-09-16", 2, 1,
+                       datetime.now().isoformat(), "", f"Cliente {prefix}{i}", "", "") for i in range(count)]
+
+
+def _store(tmp, device):
+    os.makedirs(os.path.join(tmp, device), exist_ok=True)
+    return get_store(os.path.join(tmp, device, "tickets.csv"))
+
+
+def _late_file(backend, tmp):
+    """Push a delta file from a third device and date it a minute before every other file."""
+    rows = _rows("late", 5)
+    store = _store(tmp, "late")
+    store.add_tickets(rows)
+    before = {f["id"] for f in backend.list_since(FOLDER)}
+    push_delta(store.csv_file, FOLDER, backend)
+    file_id = next(f["id"] for f in backend.list_since(FOLDER) if f["id"] not in before)
+    past = (datetime.now(timezone.utc) - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    if isinstance(backend, LocalBackend):
+        # LocalBackend keeps the createdTime in the file name
+        name = os.path.basename(file_id)
+        os.rename(os.path.join(backend.root, file_id), os.path.join(backend.root, FOLDER, f"{past}__{name.partition('__')[2]}"))
+    else:
+        backend.service.meta[file_id]["createdTime"] = past
+    return [row["hashed_token"] for row in rows]
+
+
+def _exchange(name, backend, tmp):
+    failures = []
+    a, b = _store(tmp, "a"), _store(tmp, "b")
+
+    sold = _rows("a", 50)
+    a.add_tickets(sold)
+    sent = push_delta(a.csv_file, FOLDER, backend)
+    received = pull_delta(b.csv_file, FOLDER, backend)
+    if (sent, received, b.count()) != (50, 50, 50):
+        failures.append(f"venta: enviados {sent}, recibidos {received}, B tiene {b.count()}")
+
+    checked_in = [row["hashed_token"] for row in sold[:10]]
+    b.redeem_many(checked_in)
+    push_delta(b.csv_file, FOLDER, backend)
+    pull_delta(a.csv_file, FOLDER, backend)
+    if any(a.get_by_hash(token)["estado"] != "invalido" for token in checked_in):
+        failures.append("check-ins de B no llegaron a A")
+
+    if pull_delta(b.csv_file, FOLDER, backend) or pull_delta(a.csv_file, FOLDER, backend):
+        failures.append("una segunda descarga volvió a aplicar archivos")
+
+    late = _late_file(backend, tmp)
+    pull_delta(b.csv_file, FOLDER, backend)
+    if any(b.get_by_hash(token) is None for token in late):
+        failures.append("archivo listado tarde no llegó a B")
+
+    more = _rows("w", 20)
+    a.add_tickets(more)
+    worker = SyncWorker(a.csv_file, sync_fn=lambda path, push, pull: sync_delta(path, FOLDER, backend, push, pull),
+                        debounce=0.05)
+    try:
+        worker.request_sync()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            status = worker.status()
+            if not status["pending"] and not status["running"] and (status["last_success"] or status["last_error"]):
+                break
+            time.sleep(0.05)
+    finally:
+        worker.stop(timeout=5)
+    if status["last_error"]:
+        failures.append(f"SyncWorker falló: {status['last_error']}")
+    pull_delta(b.csv_file, FOLDER, backend)
+    if any(b.get_by_hash(row["hashed_token"]) is None for row in more):
+        failures.append("tickets enviados por SyncWorker no llegaron a B")
+
+    print(f"{name}: {b.count()} tickets en B, {len(checked_in)} check-ins en A" + ("" if failures else " - OK"))
+    return [f"{name}: {failure}" for failure in failures]
+
+
+def main():
+    failures = []
+    for name, make_backend in (("LocalBackend", lambda tmp: LocalBackend(os.path.join(tmp, "remote"))),
+                               ("Drive simulado", lambda tmp: DriveBackend(FakeDriveService()))):
+        tmp = tempfile.mkdtemp(prefix="tickets_delta_")
+        try:
+            failures += _exchange(name, make_backend(tmp), tmp)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    for failure in failures:
+        print(f"ERROR: {failure}")
+    if not failures:
+        print("OK: los dos dispositivos intercambiaron ventas y check-ins")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""In-memory stand-in for the Google Drive v3 client used by DriveBackend.
+
+Implements only files().get_media/update/create/list as called by
+storage_backends.DriveBackend; get_media requests also serve the ranged
+GETs of googleapiclient's MediaIoBaseDownload. latency (seconds) is added
+to every request to mimic the network round trip.
+"""
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class _Request:
+    def __init__(self, fn, latency):
+        self._fn = fn
+        self._latency = latency
+
+    def execute(self):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._fn()
+
+
+class _Response(dict):
+    """Response headers plus .status, like httplib2.Response."""
+
+    def __init__(self, status, headers):
+        super().__init__(headers)
+        self.status = status
+
+
+class _Http:
+    """Transport for MediaIoBaseDownload: answers "range" GETs on fake://files/<id>."""
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        if self._drive.latency:
+            time.sleep(self._drive.latency)
+        data = self._drive.contents[uri.rsplit("/", 1)[1]]
+        start, end = (int(n) for n in (headers or {})["range"].split("=")[1].split("-"))
+        chunk = data[start:end + 1]
+        return _Response(206, {"content-range": f"bytes {start}-{start + len(chunk) - 1}/{len(data)}"}), chunk
+
+
+class _MediaRequest(_Request):
+    def __init__(self, drive, file_id):
+        super().__init__(lambda: drive.contents[file_id], drive.latency)
+        self.http = _Http(drive)
+        self.uri = f"fake://files/{file_id}"
+        self.headers = {}
+
+
+class _Files:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def get_media(self, fileId):
+        return _MediaRequest(self._drive, fileId)
+
+    def update(self, fileId, media_body=None, **kwargs):
+        def run():
+            self._drive.contents[fileId] = media_body.getbytes(0, media_body.size())
+            return {"id": fileId}
+        return _Request(run, self._drive.latency)
+
+    def create(self, body, media_body=None, fields=None):
+        def run():
+            with self._drive.lock:
+                file_id = f"fake{next(self._drive.ids)}"
+                created = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                self._drive.contents[file_id] = media_body.getbytes(0, media_body.size())
+                self._drive.meta[file_id] = {"id": file_id, "createdTime": created, "parents": body.get("parents", [])}
+            return {"id": file_id, "createdTime": created}
+        return _Request(run, self._drive.latency)
+
+    def list(self, q="", orderBy=None, fields=None, pageToken=None):
+        # Only the query shapes built by DriveBackend.list_since are understood
+        folder_id = q.split("'")[1]
+        watermark = q.split("createdTime >= '")[1].rstrip("'") if "createdTime >= '" in q else ""
+
+        def run():
+            files = sorted(
+                (meta for meta in self._drive.meta.values()
+                 if folder_id in meta["parents"] and meta["createdTime"] >= watermark),
+                key=lambda meta: meta["createdTime"],
+            )
+            return {"files": [{"id": f["id"], "createdTime": f["createdTime"]} for f in files]}
+        return _Request(run, self._drive.latency)
+
+
+class FakeDriveService:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.contents = {}  # file id -> bytes
+        self.meta = {}  # file id -> {"id", "createdTime", "parents"} for files made with create()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def files(self):
+        return _Files(self)
@@ -0,0 +1,159 @@
+"""Load test for checkin_server.py: many gates redeeming against one server.
+
+Usage (from the repository root):
+    python benchmarks/load_checkin_server.py [--tickets 20000] [--gates 20] [--seconds 10]
+
+Starts the server in a subprocess on a synthetic tickets.csv, then simulates
+gates as keep-alive connections sending POST /redeem for a mix of unused,
+already-used and unknown tokens (with repeats). Reports scans per second and
+latency percentiles, and checks that every unused ticket was admitted at most
+once and that the number of admissions equals the unused tickets scanned.
+Exits 1 on failure.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+TOKEN = "load-test"  # shared secret passed to the server as TICKET_CHECKIN_TOKEN
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from run_benchmarks import SEED, _synthetic_rows, percentile, write_dataset
+from ticket_tokens import compact_token
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_for_server(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.1)
+    return False
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Authorization: Bearer {TOKEN}\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+async def _gate(port, tokens, deadline, rng, results, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.monotonic() < deadline:
+            token = rng.choice(tokens)
+            start = time.perf_counter()
+            response = await _request(reader, writer, "POST", "/redeem", {"token": token})
+            latencies.append(time.perf_counter() - start)
+            results.append((token, response["result"]))
+    finally:
+        writer.close()
+
+
+async def _run(port, tokens, gates, seconds):
+    if not await _wait_for_server(port):
+        raise RuntimeError("el servidor no respondió")
+    results, latencies = [], []
+    deadline = time.monotonic() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _gate(port, tokens, deadline, random.Random(SEED + i), results, latencies) for i in range(gates)
+    ))
+    elapsed = time.perf_counter() - start
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    stats = await _request(reader, writer, "GET", "/stats")
+    writer.close()
+    return results, latencies, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--gates", type=int, default=20, help="Conexiones simultáneas (puertas)")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="checkin_load_")
+    server = None
+    try:
+        csv_file = os.path.join(workdir, "tickets.csv")
+        rows = list(_synthetic_rows(args.tickets, random.Random(SEED)))
+        write_dataset(csv_file, rows)
+        unused = {row[0] for row in rows if row[-1] == "valido"}
+        # Unknown tokens make up about 5% of the scans
+        tokens = [row[0] for row in rows] + [compact_token(f"desconocido-{i}") for i in range(args.tickets // 20)]
+
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "checkin_server.py"), "--csv", csv_file,
+             "--host", "127.0.0.1", "--port", str(port)],
+            cwd=workdir, stdout=subprocess.DEVNULL, env={**os.environ, "TICKET_CHECKIN_TOKEN": TOKEN},
+        )
+        results, latencies, elapsed, stats = asyncio.run(_run(port, tokens, args.gates, args.seconds))
+
+        admitted = {}
+        for token, result in results:
+            if result == "valido":
+                admitted[token] = admitted.get(token, 0) + 1
+        scanned_unused = {token for token, _ in results} & unused
+        twice = [token for token, count in admitted.items() if count > 1]
+        wrong = [token for token in admitted if token not in unused]
+
+        print(f"{args.tickets} tickets, {args.gates} puertas, {elapsed:.1f}s")
+        print(f"Escaneos: {len(results)} ({len(results) / elapsed:.0f}/s)")
+        print(f"Latencia p50 {percentile(latencies, 50) * 1000:.2f} ms, p99 {percentile(latencies, 99) * 1000:.2f} ms, "
+              f"máx {max(latencies) * 1000:.0f} ms")
+        print(f"Admitidos: {len(admitted)} de {len(scanned_unused)} tickets sin usar escaneados "
+              f"(pendientes en el servidor: {stats['pending']})")
+        failures = []
+        if twice:
+            failures.append(f"{len(twice)} tickets admitidos más de una vez")
+        if wrong:
+            failures.append(f"{len(wrong)} tickets usados o desconocidos admitidos")
+        if len(admitted) != len(scanned_unused):
+            failures.append(f"{len(scanned_unused) - len(admitted)} tickets sin usar no fueron admitidos")
+        for failure in failures:
+            print(f"FALLO: {failure}")
+        if failures:
+            sys.exit(1)
+        print("OK: cada ticket se admitió una sola vez")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Reproducible benchmark suite for issuance, lookup, sync merge and rendering.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py [--sizes 1000 10000 100000 1000000]
+        [--output resultados.json] [--compare resultados_anteriores.json]
+
+For every dataset size a synthetic tickets.csv is generated (same seed, same
+rows on every run) in a scratch directory and the following are timed:
+
+    store_import         building the SQLite index from the CSV
+    find_ticket_by_hash  random lookups of existing tickets
+    generate_token       issuing a token (includes the uniqueness check)
+    safe_merge_csv       full merge against a remote copy served by a fake
+                         Drive client (half the rows shared, some redeemed)
+
+create_ticket_image does not depend on the dataset and is timed once.
+Results (throughput and p50/p95/p99 latency) are printed and, with
+--output, written as JSON together with the commit and machine they were
+measured on. --compare prints the change against an earlier JSON file.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_drive import FakeDriveService
+from storage_backends import DriveBackend
+from ticket_issuance import EVENT_TYPES, generate_token
+from ticket_render import create_ticket_image
+from ticket_search import find_ticket_by_hash
+from ticket_store import FIELDNAMES, TicketStore
+from ticket_tokens import compact_token
+from tickets_sync_service import safe_merge_csv
+
+SEED = 2024
+
+
+# --- Synthetic data ---
+
+def _synthetic_rows(n, rng):
+    for i in range(n):
+        token_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+        day = f"2026-{9 + i % 2:02d}-{1 + i % 28:02d}"
+        yield [
+            compact_token(token_id), token_id, event_type, day, rng.randint(0, 6), rng.randint(0, 4),
+            f"{day}T10:00:00", f"tickets/{event_type}/ticket_{i}.png", f"Cliente {i}", f"cliente{i}@example.com", "",
+            "invalido" if rng.random() < 0.3 else "valido",
+        ]
+
+
+def write_dataset(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(FIELDNAMES)
+        writer.writerows(rows)
+
+
+def make_datasets(workdir, n):
+    """Write tickets.csv (n rows) and remote.csv (half shared, half new). Returns the local tokens."""
+    rows = list(_synthetic_rows(n, random.Random(SEED)))
+    local_csv = os.path.join(workdir, "tickets.csv")
+    write_dataset(local_csv, rows)
+    extra = _synthetic_rows(n - n // 2, random.Random(SEED + 1))
+    write_dataset(os.path.join(workdir, "remote.csv"), (row for part in (rows[: n // 2], extra) for row in part))
+    return local_csv, [row[0] for row in rows]
+
+
+# --- Measurement ---
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, dataset_rows, samples, items_per_sample=1):
+    """samples are seconds per operation; items_per_sample scales throughput (e.g. rows per merge)."""
+    total = sum(samples)
+    return {
+        "name": name,
+        "dataset_rows": dataset_rows,
+        "samples": len(samples),
+        "ops_per_second": len(samples) * items_per_sample / total if total else 0.0,
+        "mean_ms": total / len(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_dataset(n, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{n}_")
+    try:
+        local_csv, tokens = make_datasets(workdir, n)
+        rng = random.Random(SEED)
+        results = [summarize("store_import", n, timed(TicketStore, [(local_csv,)]), items_per_sample=n)]
+
+        lookups = [(rng.choice(tokens), local_csv) for _ in range(args.lookups)]
+        find_ticket_by_hash(*lookups[0])  # builds the process-wide store
+        results.append(summarize("find_ticket_by_hash", n, timed(find_ticket_by_hash, lookups)))
+
+        issue = [("Independencia", "2026-09-16", 2, 1, local_csv)] * args.issues
+        results.append(summarize("generate_token", n, timed(generate_token, issue)))
+
+        service = FakeDriveService(latency=args.drive_latency_ms / 1000)
+        with open(os.path.join(workdir, "remote.csv"), "rb") as f:
+            service.contents["remote"] = f.read()
+        backend = DriveBackend(service)
+
+        def merge():
+            header, rows = safe_merge_csv(local_csv, "remote", backend)
+            for _ in rows:
+                pass
+
+        results.append(summarize("safe_merge_csv", n, timed(merge, [()] * args.merge_repeats), items_per_sample=n))
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_render(renders):
+    workdir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        jobs = [(compact_token(str(i)), os.path.join(workdir, f"ticket_{i}.png"), EVENT_TYPES[i % len(EVENT_TYPES)],
+                 2, 1, f"Cliente {i}") for i in range(renders + len(EVENT_TYPES))]
+        timed(create_ticket_image, jobs[:len(EVENT_TYPES)])  # load backgrounds and fonts
+        return [summarize("create_ticket_image", None, timed(create_ticket_image, jobs[len(EVENT_TYPES):]))]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --- Reporting ---
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _key(result):
+    return result["name"], result["dataset_rows"]
+
+
+def print_results(results, baseline=None):
+    previous = {_key(r): r for r in (baseline or {}).get("results", [])}
+    for r in results:
+        size = f"{r['dataset_rows']:>8} filas" if r["dataset_rows"] else " " * 14
+        line = (f"{r['name']:<20} {size}  {r['ops_per_second']:>12,.1f}/s  "
+                f"p50 {r['p50_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms  p99 {r['p99_ms']:8.3f} ms")
+        old = previous.get(_key(r))
+        if old and old["ops_per_second"]:
+            line += f"  ({(r['ops_per_second'] / old['ops_per_second'] - 1) * 100:+.1f}% vs {baseline['environment']['commit']})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de emisión, búsqueda, sincronización y renderizado.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--issues", type=int, default=500)
+    parser.add_argument("--merge-repeats", type=int, default=3)
+    parser.add_argument("--renders", type=int, default=30)
+    parser.add_argument("--drive-latency-ms", type=float, default=0.0, help="Latencia simulada por petición a Drive")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        results += bench_dataset(n, args)
+    results += bench_render(args.renders)
+
+    report = {"environment": environment(), "parameters": vars(args), "results": results}
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Multi-process stress test for concurrent ticket writes.
+
+Usage (from the repository root):
+    python benchmarks/stress_concurrency.py [--issuers 4] [--gates 3] [--tickets 200]
+
+Runs cashier processes issuing tickets, gate processes redeeming a shared set
+of tickets and a sync process repeatedly merging tickets.csv with a local
+"remote" copy, all against the same tickets.csv. Afterwards it checks that
+every issued ticket is in the CSV exactly once, that every ticket was
+redeemed exactly once and that the CSV parses cleanly. Exits 1 on failure.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _issue(csv_file, count):
+    from ticket_issuance import generate_token, save_ticket_info
+    tokens = []
+    for i in range(count):
+        hashed_token, token_id = generate_token("Independencia", "2026-09-16", 2, 1, csv_file=csv_file)
+        save_ticket_info(hashed_token, token_id, "Independencia", "2026-09-16", 2, 1,
+                         datetime.now().isoformat(), "", f"Cliente {i}", "", "", csv_file=csv_file)
+        tokens.append(hashed_token)
+    return tokens
+
+
+def _redeem(csv_file, tokens):
+    from ticket_store import get_store
+    store = get_store(csv_file)
+    return [token for token in tokens if store.redeem(token) == "redeemed"]
+
+
+def _sync(csv_file, remote_dir, stop):
+    from storage_backends import LocalBackend
+    from tickets_sync_service import download_csv, upload_csv
+    backend = LocalBackend(remote_dir)
+    runs = 0
+    while not stop.is_set():
+        upload_csv(csv_file, "tickets.csv", backend) if runs % 2 else download_csv(csv_file, "tickets.csv", backend)
+        runs += 1
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issuers", type=int, default=4)
+    parser.add_argument("--gates", type=int, default=3)
+    parser.add_argument("--tickets", type=int, default=200, help="Tickets por cajero y tickets a canjear")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="tickets_stress_")
+    csv_file = os.path.join(tmp, "tickets.csv")
+    remote_dir = os.path.join(tmp, "remote")
+    ctx = multiprocessing.get_context("spawn")  # every process opens its own store
+    try:
+        with ctx.Pool(1) as setup:
+            to_redeem = setup.apply(_issue, (csv_file, args.tickets))
+        os.makedirs(remote_dir)
+        shutil.copyfile(csv_file, os.path.join(remote_dir, "tickets.csv"))
+
+        start = time.perf_counter()
+        with ctx.Manager() as manager, ctx.Pool(args.issuers + args.gates + 1) as pool:
+            stop = manager.Event()
+            syncer = pool.apply_async(_sync, (csv_file, remote_dir, stop))
+            issuers = [pool.apply_async(_issue, (csv_file, args.tickets)) for _ in range(args.issuers)]
+            gates = [pool.apply_async(_redeem, (csv_file, to_redeem)) for _ in range(args.gates)]
+            issued = to_redeem + [token for result in issuers for token in result.get()]
+            redeemed = [token for result in gates for token in result.get()]
+            stop.set()
+            sync_runs = syncer.get()
+        elapsed = time.perf_counter() - start
+
+        from ticket_store import get_store
+        get_store(csv_file).compact()
+        with open(csv_file, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f, delimiter=";"))
+        tokens = [row["hashed_token"] for row in rows]
+        states = {row["hashed_token"]: row["estado"] for row in rows}
+
+        failures = []
+        if len(tokens) != len(set(tokens)):
+            failures.append(f"{len(tokens) - len(set(tokens))} filas duplicadas")
+        missing = set(issued) - set(tokens)
+        if missing:
+            failures.append(f"{len(missing)} tickets perdidos")
+        if any(None in row or len(row) != len(rows[0]) for row in rows):
+            failures.append("filas incompletas en el CSV")
+        if sorted(redeemed) != sorted(to_redeem):
+            failures.append(f"{len(redeemed)} canjes para {len(to_redeem)} tickets")
+        if any(states.get(token) != "invalido" for token in to_redeem):
+            failures.append("canjes que no llegaron al CSV")
+
+        print(f"{len(issued)} tickets emitidos, {len(redeemed)} canjes y {sync_runs} sincronizaciones "
+              f"en {elapsed:.1f}s con {args.issuers} cajeros y {args.gates} puertas")
+        for failure in failures:
+            print(f"ERROR: {failure}")
+        if not failures:
+            print("OK: ningún ticket perdido ni duplicado")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date
+
+from checkin_journal import CheckinJournal
+from event_registry import get_event
+from metrics import increment, timed
+from ticket_snapshot import load_snapshot
+from ticket_store import get_store
+from ticket_tokens import is_signed, normalize_token, signing_enabled, verify_signed
+
+# Results of CheckinEngine.validate / redeem
+VALID = "valido"
+REDEEMED = "invalido"
+UNKNOWN = "desconocido"
+
+
+def admissible_claims(hashed_token):
+    """Claims of a signed ticket this gate may admit without a store row, else None.
+
+    Needs signing turned on (see signing_enabled), a valid signature, an
+    event in the registry and a purchase date that is not in the future.
+    """
+    if not signing_enabled():
+        return None
+    claims = verify_signed(hashed_token)
+    if not claims or get_event(claims["event_type"]) is None or claims["date"] > date.today().isoformat():
+        return None
+    return claims
+
+
+def _key(hashed_token):
+    # 64-hex tokens are held as 32 raw bytes; compact tokens as their canonical string
+    token = normalize_token(hashed_token)
+    try:
+        return bytes.fromhex(token) if len(token) == 64 else token
+    except ValueError:
+        return token
+
+
+class CheckinEngine:
+    """Offline-first gate validation against an in-memory token -> redeemed map.
+
+    The map is loaded from the ticket store once at gate start. Redemptions
+    are applied in memory, persisted to a per-gate journal and replayed into
+    the ticket store by reconcile(), so a scan never waits on disk or network.
+    Signed ("S1") tickets are accepted on their signature alone, so they work
+    even when sold after the gate's copy of the store was taken.
+    """
+
+    def __init__(self, csv_file="tickets.csv", gate_id="gate", latency_window=2000):
+        self.csv_file = csv_file
+        self.gate_id = gate_id
+        self.store = get_store(csv_file)
+        self.pending = CheckinJournal(os.path.splitext(csv_file)[0] + f"_{gate_id}_pending.log")
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        self._redeemed = {}
+        self._latencies = deque(maxlen=latency_window)
+        self._scan_times = deque()
+        self._scans = 0
+        self.conflicts = []  # tokens another gate had already redeemed at reconcile time
+        self.last_reconcile = time.time()
+        self.load()
+
+    def load(self):
+        """(Re)build the in-memory map from the store plus this gate's unsynced redemptions."""
+        snapshot = load_snapshot(self.csv_file, ["hashed_token", "estado"])
+        if snapshot is not None:
+            # Current columnar snapshot: no SQLite scan needed
+            states = zip(snapshot["hashed_token"].tolist(), (snapshot["estado"] == REDEEMED).tolist())
+            redeemed = {_key(token): is_redeemed for token, is_redeemed in states}
+        else:
+            redeemed = {_key(token): estado == REDEEMED for token, estado in self.store.ticket_states()}
+        events, _ = self.pending.read_from(0)
+        # Redemptions held by any gate on this store stay used even once the sale arrives
+        for token in [event[0] for event in events] + self.store.held_tokens():
+            redeemed[_key(token)] = True
+        with self._lock:
+            self._redeemed = redeemed
+
+    def _record(self, start):
+        now = time.perf_counter()
+        self._latencies.append(now - start)
+        self._scan_times.append(now)
+        self._scans += 1
+        while self._scan_times and now - self._scan_times[0] > 60:
+            self._scan_times.popleft()
+
+    def _fetch(self, key, hashed_token):
+        """State of a ticket missing from the map, read from the store. Called without the gate lock."""
+        # Sold after the gate started: the store also holds redemptions other gates reconciled
+        token = normalize_token(hashed_token)
+        ticket = self.store.get_by_hash(token)
+        if ticket:
+            # A signed ticket may have been admitted (and held) before its sale arrived
+            state = ticket.get("estado") == REDEEMED or (is_signed(token) and self.store.is_held(token))
+        elif admissible_claims(hashed_token):
+            # Genuine signed ticket whose sale has not reached this store. Unused ones
+            # are not cached, so the next scan checks the store again.
+            state = self.store.is_held(token)
+            if not state:
+                return state
+        else:
+            return None
+        with self._lock:
+            # A redemption made while the store was read wins
+            return self._redeemed.setdefault(key, state)
+
+    def _lookup(self, key, hashed_token, use_store):
+        # A single dict read needs no lock; the store may be held for seconds by a
+        # reconcile or sync, so it is never read under the gate lock
+        state = self._redeemed.get(key)
+        if state is None and use_store:
+            state = self._fetch(key, hashed_token)
+        return state
+
+    @timed("checkin_validate")
+    def validate(self, hashed_token, use_store=True):
+        """Return VALID, REDEEMED or UNKNOWN without changing anything.
+
+        With use_store=False a ticket missing from the in-memory map returns
+        None instead of being looked up in the store.
+        """
+        start = time.perf_counter()
+        key = _key(hashed_token)
+        state = self._lookup(key, hashed_token, use_store)
+        if state is None and not use_store:
+            return None
+        with self._lock:
+            self._record(start)
+        result = UNKNOWN if state is None else REDEEMED if state else VALID
+        increment("scans", result=result)
+        return result
+
+    @timed("checkin_redeem")
+    def redeem(self, hashed_token, use_store=True):
+        """Redeem a ticket once. Returns VALID when it was just redeemed, else REDEEMED/UNKNOWN.
+
+        use_store works as in validate().
+        """
+        start = time.perf_counter()
+        key = _key(hashed_token)
+        state = self._lookup(key, hashed_token, use_store)
+        if state is None and not use_store:
+            return None
+        with self._lock:
+            # Another scan may have redeemed it since the lookup
+            state = self._redeemed.get(key, state)
+            if state is None:
+                self._record(start)
+                increment("checkins", result=UNKNOWN)
+                return UNKNOWN
+            if state:
+                self._record(start)
+                increment("checkins", result=REDEEMED)
+                return REDEEMED
+            self._redeemed[key] = True
+            with self.pending.locked():
+                self.pending.append(normalize_token(hashed_token), REDEEMED)
+            self._record(start)
+        increment("checkins", result=VALID)
+        return VALID
+
+    def ticket_details(self, hashed_token):
+        """Ticket fields for display: the stored row, else an admissible signed token's own claims."""
+        return self.store.get_by_hash(normalize_token(hashed_token)) or admissible_claims(hashed_token)
+
+    @timed("checkin_reconcile")
+    def reconcile(self, reload=False):
+        """Replay pending redemptions into the ticket store; optionally reload the full map."""
+        with self._reconcile_lock:
+            with self._lock, self.pending.locked():
+                events, offset = self.pending.read_from(0)
+            # Store writes happen outside the gate lock so scans are not held up
+            tokens = [event[0] for event in events]
+            unsynced = []
+            for token, result in zip(tokens, self.store.redeem_many(tokens)):
+                if result == "already_redeemed":
+                    self.conflicts.append(token)
+                elif result == "not_found" and is_signed(token):
+                    # Signed ticket whose sale has not reached this store yet; retry next time
+                    unsynced.append(token)
+            self.store.hold_redemptions(unsynced)
+            self.store.release_redemptions([t for t in tokens if is_signed(t) and t not in unsynced])
+            with self._lock, self.pending.locked():
+                newer, _ = self.pending.read_from(offset)
+                self.pending.truncate()
+                keep = unsynced + [event[0] for event in newer]
+                if keep:
+                    self.pending.append_many([(token, REDEEMED) for token in keep])
+        if reload:
+            self.load()
+        self.last_reconcile = time.time()
+        return len(events) - len(unsynced)
+
+    def needs_reconcile(self, max_pending=20, max_age=60):
+        return self.pending_count() >= max_pending or (self.pending_count() and time.time() - self.last_reconcile > max_age)
+
+    def pending_count(self):
+        events, _ = self.pending.read_from(0)
+        return len(events)
+
+    def stats(self):
+        """Scan throughput and latency (ms) over the recent window."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            now = time.perf_counter()
+            scans_last_minute = sum(1 for t in self._scan_times if now - t <= 60)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            index = min(len(latencies) - 1, int(p / 100 * len(latencies)))
+            return latencies[index] * 1000
+
+        return {
+            "scans": self._scans,
+            "scans_per_minute": scans_last_minute,
+            "p50_ms": percentile(50),
+            "p99_ms": percentile(99),
+            "tickets_loaded": len(self._redeemed),
+        }
+
+
+class RecentScans:
+    """Results of the latest scans, so a code read again within window seconds is not re-processed.
+
+    Cameras report the same code several times while it is in view; a repeat
+    returns the first result instead of hitting the engine (which would
+    report a ticket just admitted as already used).
+    """
+
+    def __init__(self, window=3.0, max_entries=64):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (time, result)
+
+    def get(self, hashed_token, now=None):
+        now = time.monotonic() if now is None else now
+        while self._entries:
+            token, (seen_at, _) = next(iter(self._entries.items()))
+            if now - seen_at <= self.window:
+                break
+            del self._entries[token]
+        entry = self._entries.get(normalize_token(hashed_token))
+        return entry[1] if entry else None
+
+    def put(self, hashed_token, result, now=None):
+        token = normalize_token(hashed_token)
+        self._entries.pop(token, None)
+        self._entries[token] = (time.monotonic() if now is None else now, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,70 @@
+import csv
+import io
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+
+class CheckinJournal:
+    """Append-only log of ticket state changes (hashed_token;estado;timestamp).
+
+    Events are folded into the ticket store on read and compacted into
+    tickets.csv from time to time, so a check-in never rewrites the CSV.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        """Hold an advisory lock on the journal (shared for readers, exclusive for writers)."""
+        with open(self.path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def append(self, hashed_token, estado):
+        """Append one state change. Caller must hold the exclusive lock."""
+        self.append_many([(hashed_token, estado)])
+
+    def append_many(self, events):
+        """Append (hashed_token, estado) changes in one write and fsync. Caller must hold the exclusive lock."""
+        timestamp = datetime.now().isoformat()
+        lines = io.StringIO()
+        csv.writer(lines, delimiter=";").writerows([token, estado, timestamp] for token, estado in events)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.getvalue().encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read_from(self, offset):
+        """Return (events, new_offset) for the complete lines written after offset."""
+        if not os.path.exists(self.path):
+            return [], 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # Ignore a trailing partial line; it is picked up on the next read
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode("utf-8").splitlines()
+        events = [row for row in csv.reader(lines, delimiter=";") if len(row) >= 2]
+        return events, offset + end
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self):
+        """Drop all events. Caller must hold the exclusive lock."""
+        with open(self.path, "wb"):
+            pass
@@ -0,0 +1,224 @@
+"""Check-in service shared by all gates of a venue.
+
+Usage:
+    TICKET_CHECKIN_TOKEN=<secret> python checkin_server.py [--csv tickets.csv] [--host 0.0.0.0] [--port 8765]
+
+One asyncio process owns the redemption state (a CheckinEngine) and every
+scanner talks to it over HTTP/1.1 keep-alive with JSON bodies:
+
+    POST /validate   {"token": "..."}  -> {"estado": "valido" | "invalido" | "desconocido"}
+    POST /redeem     {"token": "..."}  -> {"result": "valido" | "invalido" | "desconocido"}
+    POST /ticket     {"token": "..."}  -> {"ticket": {...} | null}
+    POST /reconcile                    -> {"reconciled": n}
+    GET  /stats                        -> gate statistics
+    GET  /metrics                      -> Prometheus text (see metrics.py)
+
+"valido" from /redeem means the ticket was admitted by this call; a second
+redeem of the same ticket, from any gate, gets "invalido". Scans of tickets
+in the engine's in-memory map are answered on the event loop; anything that
+reads the ticket store runs in a thread, and the engine's lock keeps
+redeem-once. The Streamlit Check-in tab uses this service instead of its own
+engine when TICKET_CHECKIN_SERVER is set (e.g. http://10.0.0.5:8765).
+
+Every endpoint except /metrics requires "Authorization: Bearer <secret>"
+with the shared TICKET_CHECKIN_TOKEN; CheckinClient sends it. The server
+listens on 127.0.0.1 by default and refuses other addresses without a token.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import urllib.request
+
+import metrics
+from checkin_engine import CheckinEngine
+
+RECONCILE_INTERVAL = 5.0  # seconds between checks for pending redemptions to persist
+MAX_BODY = 64 * 1024
+# Fields returned by /ticket (no email or internal columns)
+TICKET_FIELDS = ("event_type", "date", "adults", "children", "generated_at", "nombre", "comentarios", "estado")
+
+
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+class CheckinServer:
+    def __init__(self, csv_file="tickets.csv", gate_id="server", sync=False, token=None):
+        self.engine = CheckinEngine(csv_file, gate_id)
+        self.sync = sync
+        self.token = token if token is not None else os.environ.get("TICKET_CHECKIN_TOKEN", "")
+        self._server = None
+
+    def authorized(self, headers):
+        if not self.token:
+            return True
+        return hmac.compare_digest(headers.get("authorization", ""), f"Bearer {self.token}")
+
+    # --- Request handling ---
+    async def handle(self, method, path, body, headers=None):
+        """Return (status, payload) for one request.
+
+        Scans answered from the in-memory map run on the event loop; store
+        lookups, reconcile and reload go to a thread so no gate waits on the
+        store.
+        """
+        route = path.split("?", 1)[0].rstrip("/")
+        if method == "GET" and route == "/metrics":
+            return 200, metrics.prometheus_text()
+        if not self.authorized(headers or {}):
+            return 401, {"error": "unauthorized"}
+        if method == "GET" and route == "/stats":
+            stats = self.engine.stats()
+            stats.update(pending=self.engine.pending_count(), conflicts=self.engine.conflicts[-100:])
+            return 200, stats
+        if method != "POST":
+            return 404, {"error": "not found"}
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if route == "/reconcile":
+            reconciled = await asyncio.to_thread(self.engine.reconcile, reload=bool(data.get("reload")))
+            return 200, {"reconciled": reconciled}
+        token = str(data.get("token") or "")
+        if not token:
+            return 400, {"error": "token is required"}
+        if route in ("/redeem", "/validate"):
+            scan = self.engine.redeem if route == "/redeem" else self.engine.validate
+            result = scan(token, use_store=False)
+            if result is None:
+                # Not in the in-memory map: the store lookup may wait on a running reconcile
+                result = await asyncio.to_thread(scan, token)
+            return 200, {"result" if route == "/redeem" else "estado": result}
+        if route == "/ticket":
+            ticket = await asyncio.to_thread(self.engine.ticket_details, token)
+            return 200, {"ticket": {k: ticket[k] for k in TICKET_FIELDS if k in ticket} if ticket else None}
+        return 404, {"error": "not found"}
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.handle(method, path, body, headers)
+                if isinstance(payload, str):
+                    content, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+                else:
+                    content, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\nContent-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _reconcile_loop(self):
+        # Persist redemptions to the ticket store off the event loop
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            if self.engine.needs_reconcile(max_age=RECONCILE_INTERVAL):
+                try:
+                    await asyncio.to_thread(self.engine.reconcile)
+                    if self.sync:
+                        from tickets_sync_service import get_sync_worker
+                        get_sync_worker(self.engine.csv_file).request_sync()
+                except Exception as e:
+                    print(f"[CheckinServer] Reconcile failed: {e}")
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        print(f"[CheckinServer] Listening on {host}:{port} ({self.engine.stats()['tickets_loaded']} tickets)")
+        reconcile = asyncio.create_task(self._reconcile_loop())
+        if ready is not None:
+            ready.set()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            reconcile.cancel()
+            self.engine.reconcile()
+
+
+class CheckinClient:
+    """Blocking client with the CheckinEngine methods the Check-in tab uses."""
+
+    def __init__(self, url, timeout=5, token=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.token = token if token is not None else os.environ.get("TICKET_CHECKIN_TOKEN", "")
+
+    def _call(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url + path, data=data, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def validate(self, hashed_token):
+        return self._call("/validate", {"token": hashed_token})["estado"]
+
+    def ticket_details(self, hashed_token):
+        return self._call("/ticket", {"token": hashed_token})["ticket"]
+
+    def redeem(self, hashed_token):
+        return self._call("/redeem", {"token": hashed_token})["result"]
+
+    def reconcile(self, reload=False):
+        return self._call("/reconcile", {"reload": reload})["reconciled"]
+
+    def needs_reconcile(self, max_pending=20, max_age=60):
+        return False  # the server persists redemptions itself
+
+    def stats(self):
+        return self._call("/stats")
+
+    def pending_count(self):
+        return self.stats()["pending"]
+
+    @property
+    def conflicts(self):
+        return self.stats()["conflicts"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de check-in compartido por todas las puertas.")
+    parser.add_argument("--csv", default="tickets.csv", help="Archivo de tickets")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Dirección de escucha; para otras puertas en la red usa 0.0.0.0 con TICKET_CHECKIN_TOKEN")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("TICKET_CHECKIN_PORT", "8765")))
+    parser.add_argument("--gate-id", default="server", help="Identificador para el diario de check-ins pendientes")
+    parser.add_argument("--sync", action="store_true", help="Sincronizar con el almacenamiento remoto tras cada conciliación")
+    args = parser.parse_args()
+    if args.host not in LOOPBACK_HOSTS and not os.environ.get("TICKET_CHECKIN_TOKEN"):
+        parser.error("para escuchar en la red define TICKET_CHECKIN_TOKEN (secreto compartido con las puertas)")
+    try:
+        asyncio.run(CheckinServer(args.csv, args.gate_id, args.sync).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+
+# Events on sale and how their tickets are drawn, read from events.json
+# (TICKET_EVENTS_FILE). Each entry may set:
+#   name        event_type stored in tickets.csv (required)
+#   background  background image; a blank 600x400 ticket when the file is missing
+#   folder      subfolder of tickets/ for saved images (default: name)
+#   qr          {"center": [x, y], "offset": [dx, dy], "size": px}; center
+#               defaults to the middle of the background, size to 615
+#   text        {"top": y, "gap": 10, "line_spacing": 4, "padding": 8,
+#                "color": [r, g, b], "box_color": [r, g, b, a]}; without top
+#               the lines start gap px below the QR code
+#   font        {"candidates": [paths], "size": 28}; first that loads wins
+EVENTS_FILE = os.environ.get("TICKET_EVENTS_FILE", "events.json")
+
+FONT_CANDIDATES = [
+    "arial.ttf",  # Windows
+    "/Library/Fonts/Arial.ttf",  # macOS
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf"
+]
+DEFAULT_QR = {"center": None, "offset": [0, 0], "size": 615}
+DEFAULT_TEXT = {"top": None, "gap": 10, "line_spacing": 4, "padding": 8, "color": [0, 0, 0], "box_color": [255, 255, 255, 220]}
+DEFAULT_FONT = {"candidates": FONT_CANDIDATES, "size": 28}
+# Used when there is no events.json, e.g. an install that predates it
+BUILTIN_EVENTS = [
+    {"name": "Independencia", "background": "ticket_bg_independencia.png", "qr": {"offset": [0, 550]}},
+    {"name": "Dia de Muertos", "background": "ticket_bg_muertos.png"},
+]
+
+_events = None
+_events_lock = threading.Lock()
+
+
+def normalize_event(entry):
+    """Fill in the defaults of one events.json entry."""
+    if not isinstance(entry, dict) or not str(entry.get("name") or "").strip():
+        raise ValueError(f"Event entry without a name: {entry!r}")
+    name = str(entry["name"]).strip()
+    return {
+        "name": name,
+        "background": entry.get("background"),
+        "folder": entry.get("folder") or name,
+        "qr": {**DEFAULT_QR, **(entry.get("qr") or {})},
+        "text": {**DEFAULT_TEXT, **(entry.get("text") or {})},
+        "font": {**DEFAULT_FONT, **(entry.get("font") or {})},
+    }
+
+
+def load_events(path=None):
+    """Read and validate the registry. Returns the events in file order."""
+    path = path or EVENTS_FILE
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get("events") if isinstance(data, dict) else data
+    else:
+        print(f"[TicketGen] {path} not found, using the built-in events")
+        entries = BUILTIN_EVENTS
+    events = [normalize_event(entry) for entry in entries or []]
+    names = [event["name"] for event in events]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate events in {path}: {', '.join(duplicates)}")
+    if not events:
+        raise ValueError(f"No events defined in {path}")
+    return events
+
+
+def get_events():
+    """The registry, loaded once per process (see reload_events)."""
+    global _events
+    with _events_lock:
+        if _events is None:
+            _events = {event["name"]: event for event in load_events()}
+        return _events
+
+
+def reload_events():
+    global _events
+    with _events_lock:
+        _events = None
+    return get_events()
+
+
+def event_types():
+    return list(get_events())
+
+
+def get_event(event_type):
+    """Registry entry for event_type, or None if it is not on sale."""
+    return get_events().get(event_type)
+
+
+def event_spec(event_type):
+    """Registry entry used to draw event_type; unknown events get the default layout."""
+    return get_event(event_type) or normalize_event({"name": event_type})
+
+
+def event_folder(event_type, output_dir="tickets"):
+    """Folder where the images of an event's tickets are saved."""
+    return os.path.join(output_dir, event_spec(event_type)["folder"])
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# TICKET_METRICS=0 turns instrumentation off: timed() then returns functions
+# unchanged and timer() a shared no-op context, so the hot paths pay nothing.
+ENABLED = os.environ.get("TICKET_METRICS", "1") != "0"
+# Optional JSON-lines log with one record per timed operation
+LOG_PATH = os.environ.get("TICKET_METRICS_LOG")
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_timers = {}  # operation -> {"count", "sum", "max", "buckets"}
+_counters = {}  # (name, sorted label items) -> value
+_log_file = None
+_NULL = nullcontext()
+
+
+def _observe(operation, seconds):
+    global _log_file
+    with _lock:
+        entry = _timers.get(operation)
+        if entry is None:
+            entry = _timers[operation] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+        entry["count"] += 1
+        entry["sum"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry["buckets"][i] += 1
+                break
+        if LOG_PATH:
+            if _log_file is None:
+                _log_file = open(LOG_PATH, "a", encoding="utf-8")
+            _log_file.write(json.dumps({"ts": time.time(), "op": operation, "ms": round(seconds * 1000, 3)}) + "\n")
+            _log_file.flush()
+
+
+@contextmanager
+def _timing(operation):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _observe(operation, time.perf_counter() - start)
+
+
+def timer(operation):
+    """Context manager timing a block as operation."""
+    return _timing(operation) if ENABLED else _NULL
+
+
+def timed(operation):
+    """Decorator timing every call of a function as operation."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _observe(operation, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def increment(name, value=1, **labels):
+    """Add value to a counter, e.g. increment("checkins", result="valido")."""
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def snapshot():
+    """Return {"timers": [...], "counters": [...]} for display."""
+    with _lock:
+        timers = [
+            {"operation": op, "count": e["count"], "mean_ms": e["sum"] / e["count"] * 1000, "max_ms": e["max"] * 1000}
+            for op, e in sorted(_timers.items())
+        ]
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+    return {"timers": timers, "counters": counters}
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def _labels(items):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+
+def prometheus_text():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP ticket_operation_seconds Duration of ticket operations.",
+        "# TYPE ticket_operation_seconds histogram",
+    ]
+    with _lock:
+        for op, e in sorted(_timers.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, e["buckets"]):
+                cumulative += count
+                lines.append(f'ticket_operation_seconds_bucket{{operation="{op}",le="{bound}"}} {cumulative}')
+            lines.append(f'ticket_operation_seconds_bucket{{operation="{op}",le="+Inf"}} {e["count"]}')
+            lines.append(f'ticket_operation_seconds_sum{{operation="{op}"}} {e["sum"]:.6f}')
+            lines.append(f'ticket_operation_seconds_count{{operation="{op}"}} {e["count"]}')
+        names = sorted({name for name, _ in _counters})
+        for name in names:
+            lines.append(f"# TYPE ticket_{name}_total counter")
+            for (counter, labels), value in sorted(_counters.items()):
+                if counter == name:
+                    lines.append(f"ticket_{name}_total{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve prometheus_text() at /metrics from a daemon thread. Returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+from qrcode.exceptions import DataOverflowError
+from PIL import Image
+
+# Finder-like 1:1:3:1:1 sequences with four light modules on either side (penalty rule 3)
+_FINDER_PATTERNS = np.array([
+    [1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+], dtype=np.int8)
+
+
+def mask_penalty(modules):
+    """ISO/IEC 18004 mask penalty score, vectorized with NumPy."""
+    m = np.array(modules, dtype=np.int8)
+    n = m.shape[0]
+    score = 0
+    for grid in (m, m.T):
+        # Rule 1: runs of 5+ same-colored modules score 3 + (run - 5)
+        boundaries = np.ones((n, n + 1), dtype=bool)
+        boundaries[:, 1:-1] = grid[:, 1:] != grid[:, :-1]
+        runs = np.diff(np.nonzero(boundaries)[1])
+        runs = runs[runs >= 5]
+        score += int((runs - 2).sum())
+        # Rule 3: finder-like patterns
+        windows = np.lib.stride_tricks.sliding_window_view(grid, 11, axis=1)
+        for pattern in _FINDER_PATTERNS:
+            score += 40 * int((windows == pattern).all(axis=2).sum())
+    # Rule 2: 2x2 blocks of one color
+    top_left = m[:-1, :-1]
+    blocks = (top_left == m[1:, :-1]) & (top_left == m[:-1, 1:]) & (top_left == m[1:, 1:])
+    score += 3 * int(blocks.sum())
+    # Rule 4: deviation of the dark-module ratio from 50%
+    dark_percent = m.sum() * 100.0 / m.size
+    score += 10 * int(abs(dark_percent - 50) // 5)
+    return score
+
+
+class _FastMaskQRCode(qrcode.QRCode):
+    def best_mask_pattern(self):
+        penalties = []
+        for pattern in range(8):
+            self.makeImpl(True, pattern)
+            penalties.append(mask_penalty(self.modules))
+        return int(np.argmin(penalties))
+
+
+class QREncoder:
+    """Renders tokens as QR codes at a fixed error-correction level and version.
+
+    The version is fitted once per payload shape (length and character set)
+    and reused, and the module matrix is expanded straight to the target
+    pixel size by nearest neighbor, so module edges stay sharp.
+    """
+
+    def __init__(self, error_correction=ERROR_CORRECT_M, module_px=15, border=2, target_px=None):
+        self.error_correction = error_correction
+        self.module_px = module_px
+        self.target_px = target_px  # if set, modules grow so every code is about this wide
+        self.border = border
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _shape(self, token):
+        return len(token), qrcode.util.optimal_mode(token.encode("utf-8"))
+
+    def version_for(self, token):
+        shape = self._shape(token)
+        with self._lock:
+            if shape not in self._versions:
+                qr = qrcode.QRCode(error_correction=self.error_correction)
+                qr.add_data(token)
+                qr.best_fit()
+                self._versions[shape] = qr.version
+            return self._versions[shape]
+
+    def matrix(self, token):
+        """Return the module matrix (True = dark), border included."""
+        qr = _FastMaskQRCode(version=self.version_for(token), error_correction=self.error_correction, border=self.border)
+        qr.add_data(token)
+        try:
+            qr.make(fit=False)
+        except DataOverflowError:
+            # Mixed-mode payloads can need more room than others of the same shape
+            qr.make(fit=True)
+            with self._lock:
+                self._versions[self._shape(token)] = qr.version
+        return np.array(qr.get_matrix(), dtype=bool)
+
+    def render_mask(self, token):
+        """Return a 1-bit image at the final size where dark modules are set."""
+        matrix = self.matrix(token)
+        module_px = self.module_px
+        if self.target_px:
+            module_px = max(1, self.target_px // matrix.shape[0])
+        expanded = np.repeat(np.repeat(matrix, module_px, axis=0), module_px, axis=1)
+        return Image.fromarray(expanded)
+
+    @staticmethod
+    def paste(image, mask, position):
+        """Draw a render_mask() result (white quiet zone, black modules) onto image."""
+        x, y = position
+        image.paste((255, 255, 255, 255), (x, y, x + mask.width, y + mask.height))
+        image.paste((0, 0, 0, 255), (x, y), mask)
+
+
+# Shared encoder for ticket rendering: the box of the previous 8px-module,
+# 1.9x-scaled version 5 code; shorter payloads get proportionally larger modules
+TICKET_QR_ENCODER = QREncoder(target_px=615)
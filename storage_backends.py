@@ -0,0 +1,189 @@
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from metrics import timed
+
+load_dotenv()
+SCOPES = ["https://www.googleapis.com/auth/drive"]
+# "drive" (default) or "local"
+STORAGE_BACKEND = os.environ.get("TICKETS_STORAGE_BACKEND", "drive")
+LOCAL_REMOTE_DIR = os.environ.get("TICKETS_LOCAL_REMOTE_DIR", "remote_storage")
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class StorageBackend:
+    """Remote storage used by tickets_sync_service.
+
+    Files are addressed by id; delta files live in a folder and are listed by
+    creation time (RFC 3339 strings, which sort chronologically).
+    """
+
+    def download(self, file_id, dest_path):
+        raise NotImplementedError
+
+    def read(self, file_id):
+        raise NotImplementedError
+
+    def update(self, file_id, src_path):
+        raise NotImplementedError
+
+    def create(self, folder_id, name, src_path):
+        """Store a new file in a folder. Returns {"id": ..., "createdTime": ...}."""
+        raise NotImplementedError
+
+    def list_since(self, folder_id, watermark=""):
+        """Return [{"id", "createdTime"}] created at or after watermark, oldest first."""
+        raise NotImplementedError
+
+
+# --- Google Drive ---
+
+def _credentials_info():
+    # Build creds_info from individual env vars (for TOML or .env with flat keys)
+    keys = ["type", "project_id", "private_key_id", "private_key", "client_email", "client_id", "auth_uri",
+            "token_uri", "auth_provider_x509_cert_url", "client_x509_cert_url", "universe_domain"]
+    return {key: os.environ.get(key) for key in keys}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """Return the Drive client, building it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            # Imported here so the app starts fast and works without Google libraries/credentials
+            from googleapiclient.discovery import build
+            from google.oauth2 import service_account
+            credentials = service_account.Credentials.from_service_account_info(_credentials_info(), scopes=SCOPES)
+            _service = build("drive", "v3", credentials=credentials)
+        return _service
+
+
+def set_service(service):
+    """Inject a Drive client (or a stand-in with the same interface)."""
+    global _service
+    with _service_lock:
+        _service = service
+
+
+class DriveBackend(StorageBackend):
+    def __init__(self, service=None):
+        self._service = service
+
+    @property
+    def service(self):
+        return self._service or get_service()
+
+    @timed("drive_download")
+    def download(self, file_id, dest_path):
+        """Stream a file to disk in DOWNLOAD_CHUNK_SIZE pieces."""
+        from googleapiclient.http import MediaIoBaseDownload
+        request = self.service.files().get_media(fileId=file_id)
+        with open(dest_path, "wb") as f:
+            downloader = MediaIoBaseDownload(f, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+
+    @timed("drive_read")
+    def read(self, file_id):
+        return self.service.files().get_media(fileId=file_id).execute()
+
+    @timed("drive_update")
+    def update(self, file_id, src_path):
+        from googleapiclient.http import MediaFileUpload
+        media = MediaFileUpload(src_path, mimetype="text/csv")
+        self.service.files().update(fileId=file_id, media_body=media).execute()
+
+    @timed("drive_create")
+    def create(self, folder_id, name, src_path):
+        from googleapiclient.http import MediaFileUpload
+        media = MediaFileUpload(src_path, mimetype="text/csv")
+        return self.service.files().create(
+            body={"name": name, "parents": [folder_id]},
+            media_body=media,
+            fields="id, createdTime",
+        ).execute()
+
+    @timed("drive_list")
+    def list_since(self, folder_id, watermark=""):
+        query = f"'{folder_id}' in parents and trashed = false"
+        if watermark:
+            query += f" and createdTime >= '{watermark}'"
+        files, page_token = [], None
+        while True:
+            response = self.service.files().list(
+                q=query, orderBy="createdTime", fields="nextPageToken, files(id, createdTime)", pageToken=page_token
+            ).execute()
+            files.extend(response.get("files", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+        return files
+
+
+# --- Local filesystem (offline gates, tests, shared network folders) ---
+
+class LocalBackend(StorageBackend):
+    """Stores remote files under a local directory; ids are paths relative to it."""
+
+    def __init__(self, root=LOCAL_REMOTE_DIR):
+        self.root = root
+
+    def _path(self, file_id):
+        return os.path.join(self.root, file_id or "tickets.csv")
+
+    def download(self, file_id, dest_path):
+        shutil.copyfile(self._path(file_id), dest_path)
+
+    def read(self, file_id):
+        with open(self._path(file_id), "rb") as f:
+            return f.read()
+
+    def update(self, file_id, src_path):
+        path = self._path(file_id)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, path)
+
+    def create(self, folder_id, name, src_path):
+        created = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        # The creation time leads the file name so listing needs no stat calls
+        file_id = os.path.join(folder_id, f"{created}__{name}")
+        self.update(file_id, src_path)
+        return {"id": file_id, "createdTime": created}
+
+    def list_since(self, folder_id, watermark=""):
+        folder = self._path(folder_id)
+        if not os.path.isdir(folder):
+            return []
+        files = []
+        for name in sorted(os.listdir(folder)):
+            created, sep, _ = name.partition("__")
+            if sep and not name.endswith(".tmp") and created >= watermark:
+                files.append({"id": os.path.join(folder_id, name), "createdTime": created})
+        return files
+
+
+_backend = None
+
+
+def get_backend():
+    """Return the configured storage backend (TICKETS_STORAGE_BACKEND)."""
+    global _backend
+    if _backend is None:
+        _backend = LocalBackend() if STORAGE_BACKEND == "local" else DriveBackend()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
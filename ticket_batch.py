@@ -0,0 +1,114 @@
+"""Batch ticket generation for group sales and school bookings.
+
+Usage:
+    python ticket_batch.py pedidos.csv [--workers 4] [--csv tickets.csv] [--output-dir tickets]
+        [--format png|png-palette|webp|jpeg] [--on-demand]
+
+The input CSV is semicolon separated with the columns
+event_type;date;adults;children;nombre;email;comentarios (only the first four
+are required). Each row produces one ticket. With --on-demand (or
+TICKET_IMAGE_STORAGE=on_demand) only the rows are stored and no image is
+written; images are rendered from the rows when downloaded.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from event_registry import event_folder
+from ticket_issuance import CSV_FILE, validate_inputs, generate_token, save_tickets_bulk, ticket_row
+from ticket_render import IMAGE_FORMAT, IMAGE_FORMATS, IMAGE_STORAGE, compile_templates, create_ticket_image
+
+
+def read_batch_requests(input_csv, delimiter=";"):
+    with open(input_csv, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f, delimiter=delimiter))
+
+
+def _render(job):
+    create_ticket_image(*job)
+    return job[1]
+
+
+def generate_batch(requests, csv_file=CSV_FILE, output_dir="tickets", workers=None, chunksize=16, fmt=None, on_demand=None):
+    """Generate one ticket per request dict and append them all to tickets.csv.
+
+    QR generation and compositing run in a process pool; the CSV rows are
+    written in a single bulk append once every image has been rendered.
+    Returns a dict with the generated rows, the rejected requests and tickets/s.
+    """
+    fmt = fmt or IMAGE_FORMAT
+    on_demand = IMAGE_STORAGE == "on_demand" if on_demand is None else on_demand
+    start = time.perf_counter()
+    rows, jobs, rejected = [], [], []
+    seen_token_ids = set()
+    for i, req in enumerate(requests):
+        event_type = (req.get("event_type") or "").strip()
+        date = (req.get("date") or datetime.now().strftime("%Y-%m-%d")).strip()
+        adults = (req.get("adults") or "0").strip()
+        children = (req.get("children") or "0").strip()
+        errors = validate_inputs(event_type, date, adults, children)
+        if errors:
+            rejected.append((i, req, errors))
+            continue
+        while True:
+            hashed_token, token_id = generate_token(event_type, date, adults, children, csv_file=csv_file)
+            if token_id not in seen_token_ids:
+                break
+        seen_token_ids.add(token_id)
+        gen_time = datetime.now().isoformat()
+        nombre = req.get("nombre") or ""
+        filename = ""
+        if not on_demand:
+            folder = event_folder(event_type, output_dir)
+            os.makedirs(folder, exist_ok=True)
+            filename = os.path.join(folder, f"ticket_{event_type}_{date}_{gen_time.replace(':','-').replace('.','-')}_{token_id[:8]}{IMAGE_FORMATS[fmt]['ext']}")
+            jobs.append((hashed_token, filename, event_type, int(adults), int(children), nombre, fmt))
+        rows.append(ticket_row(
+            hashed_token, token_id, event_type, date, int(adults), int(children), gen_time, filename,
+            nombre, req.get("email") or "", req.get("comentarios") or "",
+        ))
+
+    if jobs:
+        # Each worker compiles the event templates once, before its first ticket
+        with ProcessPoolExecutor(max_workers=workers, initializer=compile_templates) as pool:
+            for _ in pool.map(_render, jobs, chunksize=chunksize):
+                pass
+
+    if rows:
+        save_tickets_bulk(rows, csv_file=csv_file)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "rejected": rejected,
+        "elapsed": elapsed,
+        "tickets_per_second": len(rows) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera tickets en lote a partir de un CSV.")
+    parser.add_argument("input_csv", help="CSV (;) con event_type, date, adults, children, nombre, email, comentarios")
+    parser.add_argument("--csv", default=CSV_FILE, help="Archivo de tickets donde se registran los boletos")
+    parser.add_argument("--output-dir", default="tickets", help="Carpeta raíz para las imágenes")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para renderizar (por defecto, uno por CPU)")
+    parser.add_argument("--delimiter", default=";", help="Delimitador del CSV de entrada")
+    parser.add_argument("--format", choices=sorted(IMAGE_FORMATS), default=None, help="Formato de las imágenes")
+    parser.add_argument("--on-demand", action="store_true", default=None,
+                        help="No guardar imágenes; se generan al descargarlas")
+    args = parser.parse_args()
+
+    requests = read_batch_requests(args.input_csv, delimiter=args.delimiter)
+    result = generate_batch(requests, csv_file=args.csv, output_dir=args.output_dir, workers=args.workers,
+                            fmt=args.format, on_demand=args.on_demand)
+    for index, req, errors in result["rejected"]:
+        print(f"[TicketBatch] Fila {index + 2} rechazada: {' '.join(errors)}")
+    print(f"[TicketBatch] {len(result['rows'])} tickets generados en {result['elapsed']:.2f}s "
+          f"({result['tickets_per_second']:.1f} tickets/s)")
+
+
+if __name__ == "__main__":
+    main()
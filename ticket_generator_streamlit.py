@@ -1,204 +1,61 @@
 import streamlit as st
 import os
-import qrcode
-from PIL import Image
-import csv
-import json
 from datetime import datetime
-import os
-import uuid
-import hashlib
-from tickets_sync_service import upload_csv, download_csv
 from dotenv import load_dotenv
-from ticket_search import find_ticket_by_hash
-from streamlit_qrcode_scanner import qrcode_scanner
-load_dotenv()
-# Constants
-EVENT_TYPES = ["Independencia", "Dia de Muertos"]
-BACKGROUND_IMAGE = "ticket_bg_independencia.png"  # Placeholder, replace with your own image
-CSV_FILE = "tickets.csv"
-
-def validate_inputs(event_type, date, adults, children):
-    errors = []
-    if event_type not in EVENT_TYPES:
-        errors.append("Invalid event type.")
-    try:
-        adults = int(adults)
-        if adults < 0:
-            errors.append("Adults must be 0 or more.")
-    except ValueError:
-        errors.append("Adults must be an integer.")
-    try:
-        children = int(children)
-        if children < 0:
-            errors.append("Children must be 0 or more.")
-    except ValueError:
-        errors.append("Children must be an integer.")
-    try:
-        datetime.strptime(date, "%Y-%m-%d")
-    except ValueError:
-        errors.append("Date must be in YYYY-MM-DD format.")
-    return errors
-
-
-def generate_token(event_type, date, adults, children):
-    # Ensure token_id is unique in tickets.csv
-    def token_id_exists(token_id):
-        if not os.path.exists(CSV_FILE):
-            return False
-        with open(CSV_FILE, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get('token_id') == token_id:
-                    return True
-        return False
-
-    while True:
-        token_id = str(uuid.uuid4())
-        if not token_id_exists(token_id):
-            break
-    # Hash the token_id for QR code
-    hashed_token = hashlib.sha256(token_id.encode()).hexdigest()
-    return hashed_token, token_id
-
-
-def save_ticket_info(hashed_token, token_id, event_type, date, adults, children, gen_time, filename, nombre, email, comentarios):
-    file_exists = os.path.isfile(CSV_FILE)
-    with open(CSV_FILE, mode="a", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile, delimiter=';')
-        if not file_exists:
-            writer.writerow(["hashed_token", "token_id", "event_type", "date", "adults", "children", "generated_at", "ticket_filename", "nombre", "email", "comentarios", "estado"])
-        writer.writerow([
-            hashed_token,
-            token_id,
-            event_type,
-            date,
-            adults,
-            children,
-            gen_time,
-            filename,
-            nombre,
-            email,
-            comentarios,
-            "valido"
-        ])
-
-
-def create_ticket_image(token, output_filename,event_type,adults, children,nombre):
-    # Generate QR code with hashed token_id
-    qr = qrcode.QRCode(box_size=8, border=2)
-    qr.add_data(token)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-
-    # Determine background image based on event type in token
-    try:
-        print("EVENT TYPE")
-        print(event_type)
-
-        if event_type == "Independencia":
-            bg_file = "ticket_bg_independencia.png"
-            print("[TicketGen] Using Independence background")
-        elif event_type == "Dia de Muertos":
-            print("[TicketGen] Using Dia de Muertos background")
-            bg_file = "ticket_bg_muertos.png"
-        else:
-            bg_file = BACKGROUND_IMAGE
-    except Exception as e:
-        print(e)
-        bg_file = BACKGROUND_IMAGE
-
-    # Load background
-    if not os.path.exists(bg_file):
-        # Create a placeholder background if not found
-        bg = Image.new("RGBA", (600, 400), (255, 255, 255, 255))
-    else:
-        bg = Image.open(bg_file).convert("RGBA")
-
-    # Make QR code 30% bigger
-    qr_w, qr_h = qr_img.size
-    new_qr_w = int(qr_w * 1.9)
-    new_qr_h = int(qr_h * 1.9)
-    qr_img = qr_img.resize((new_qr_w, new_qr_h), Image.LANCZOS)
-    qr_w, qr_h = qr_img.size
-    bg_w, bg_h = bg.size
-
-    # Adjust QR code position for 'Independencia' event
-    pos_x = (bg_w - qr_w) // 2
-    pos_y = (bg_h - qr_h) // 2
-    if event_type == "Independencia":
-        pos_y = min(bg_h - qr_h, pos_y + 550)  # Move 40px down, but not out of bounds
-    pos = (pos_x, pos_y)
-    bg.paste(qr_img, pos, qr_img)
-
-    # Draw adults/children count and nombre (if present) under QR code
-    try:
-        from PIL import ImageDraw, ImageFont
-        draw = ImageDraw.Draw(bg)
-        # Try to use a truetype font if available, else default
-        font = None
-        font_found = False
-        font_candidates = [
-            "arial.ttf",  # Windows
-            "/Library/Fonts/Arial.ttf",  # macOS
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
-            "/usr/share/fonts/truetype/freefont/FreeSans.ttf"
-        ]
-        for font_path in font_candidates:
-            try:
-                font = ImageFont.truetype(font_path, 28)
-                font_found = True
-                break
-            except Exception:
-                continue
-        if not font_found:
-            font = ImageFont.load_default()
-
-        # Compose lines to draw
-        lines = [f"Adultos: {adults}  Niños: {children}"]
-        if nombre and str(nombre).strip():
-            lines.append(f"{nombre}")
-
-        # Draw each line, stacking vertically
-        total_height = 0
-        line_sizes = []
-        for line in lines:
-            try:
-                bbox = draw.textbbox((0,0), line, font=font)
-                text_w = bbox[2] - bbox[0]
-                text_h = bbox[3] - bbox[1]
-            except Exception:
-                text_w, text_h = draw.textsize(line, font=font)
-            line_sizes.append((text_w, text_h))
-            total_height += text_h
-        total_height += (len(lines)-1)*4  # 4px spacing between lines
-
-        # Start drawing below QR code
-        start_y = pos[1] + qr_h + 10
-        if start_y + total_height > bg_h:
-            start_y = bg_h - total_height - 10
-
-        # Draw background rectangle for all lines
-        max_width = max(w for w, h in line_sizes)
-        rect_x0 = (bg_w - max_width)//2 - 8
-        rect_y0 = start_y - 4
-        rect_x1 = (bg_w + max_width)//2 + 8
-        rect_y1 = start_y + total_height + 4
-        draw.rectangle([(rect_x0, rect_y0), (rect_x1, rect_y1)], fill=(255,255,255,220))
-
-        # Draw each line
-        y = start_y
-        for i, line in enumerate(lines):
-            text_w, text_h = line_sizes[i]
-            text_x = (bg_w - text_w) // 2
-            draw.text((text_x, y), line, fill=(0,0,0), font=font)
-            y += text_h + 4
-    except Exception as e:
-        print(f"[TicketGen] Failed to draw text: {e}")
-
-    bg.save(output_filename)
-
 
+# Before the project imports: ticket_tokens, metrics and event_registry read their settings on import
+load_dotenv()
+from ticket_store import FIELDNAMES
+from event_registry import event_folder, event_types, reload_events
+from ticket_issuance import CSV_FILE, validate_inputs, generate_token, save_ticket_info
+
+# --- Process-wide resources ---
+# Streamlit re-runs this script on every interaction; these are built once per
+# process and shared by all sessions. Heavy modules are imported on first use.
+# "Recargar recursos" in the sidebar clears them.
+
+@st.cache_resource(show_spinner=False)
+def get_ticket_store():
+    from ticket_store import get_store
+    return get_store(CSV_FILE)
+
+@st.cache_resource(show_spinner=False)
+def get_sync():
+    from tickets_sync_service import get_sync_worker
+    return get_sync_worker(CSV_FILE)
+
+@st.cache_resource(show_spinner=False)
+def get_gate_engine(gate_id):
+    server_url = os.environ.get("TICKET_CHECKIN_SERVER")
+    if server_url:
+        # Shared venue-wide state served by checkin_server.py
+        from checkin_server import CheckinClient
+        return CheckinClient(server_url)
+    from checkin_engine import CheckinEngine
+    return CheckinEngine(CSV_FILE, gate_id)
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_server():
+    # Prometheus endpoint at :TICKET_METRICS_PORT/metrics, only when configured
+    port = os.environ.get("TICKET_METRICS_PORT")
+    if not port:
+        return None
+    import metrics
+    return metrics.start_http_server(int(port))
+
+@st.cache_resource(show_spinner=False)
+def get_renderer():
+    import ticket_render
+    ticket_render.compile_templates()
+    return ticket_render
+
+def reload_resources():
+    get_gate_engine.clear()
+    query_tickets.clear()
+    reload_events()
+    get_renderer().clear_asset_cache()
+
+get_metrics_server()
 
 # --- LOGIN HANDLER ---
 def login_window():
@@ -217,7 +74,7 @@ def login_window():
             if username == ADMIN_USER and password == ADMIN_PASS:
                 st.session_state['login_success'] = True
                 st.success("Acceso concedido.")
-                download_csv(CSV_FILE)  # Downloads the latest CSV from remote  
+                get_sync().request_sync(push=False)  # Pulls the latest changes in the background
             else:
                 st.error("Usuario o contraseña incorrectos.")
         st.stop()
@@ -252,6 +109,20 @@ def stop_scanning():
 def clear_hashed_token():
     st.session_state.checkin_hashed_token = ""
 
+@st.cache_data(max_entries=64, show_spinner=False)
+def query_tickets(store_version, **filters):
+    # store_version is part of the cache key, so any ticket change invalidates cached pages
+    return get_ticket_store().query(**filters)
+
+def show_sync_status():
+    status = get_sync().status()
+    if status["last_error"]:
+        st.sidebar.warning(f"Sincronización fallida ({status['failures']} intentos), reintentando. Retraso: {status['lag_seconds']:.0f}s")
+    elif status["pending"] or status["running"]:
+        st.sidebar.info(f"Sincronizando... Retraso: {status['lag_seconds']:.0f}s")
+    elif status["last_success"]:
+        st.sidebar.caption(f"Sincronizado a las {datetime.fromtimestamp(status['last_success']).strftime('%H:%M:%S')}")
+
 def main():
     login_window()
 
@@ -260,64 +131,155 @@ def main():
         ("Generar Ticket", "Administrar tickets", "Check-in"),
         index=0
     )
+    show_sync_status()
+    st.sidebar.button("Recargar recursos", on_click=reload_resources, help="Vuelve a cargar eventos (events.json), fondos, fuentes y el índice de check-in")
 
     if tab == "Administrar tickets":
         st.header("Administrar registro de tickets")
-        # Show table of tickets.csv (hide hashed_token)
-        import pandas as pd
-        if os.path.exists(CSV_FILE):
-            try:
-                df = pd.read_csv(CSV_FILE, delimiter=';')
-                if 'hashed_token' in df.columns:
-                    df = df.drop(columns=['hashed_token'])
-                if 'token_id' in df.columns:
-                    df = df.drop(columns=['token_id'])
-                # Move 'nombre' to the first column if present
-                cols = list(df.columns)
-                if 'nombre' in cols:
-                    cols.insert(0, cols.pop(cols.index('nombre')))
-                    df = df[cols]
-                st.subheader("Base de datos de tickets (solo lectura)")
-                st.dataframe(df, use_container_width=True, hide_index=True)
-                # Show totals grouped by event_type
-                if 'event_type' in df.columns and 'adults' in df.columns and 'children' in df.columns:
-                    # Try both possible column names for compatibility
-                    adults_col = 'adults' if 'adults' in df.columns else 'adultos'
-                    children_col = 'children' if 'children' in df.columns else 'niños'
-                    summary = df.groupby('event_type')[[adults_col, children_col]].sum().reset_index()
-                    st.markdown("**Total de boletos vendidos:**")
-                    table_md = "Evento | adultos | niños\n---|---|---\n"
-                    for _, row in summary.iterrows():
-                        table_md += f"{row['event_type']} | {row[adults_col]} | {row[children_col]}\n"
-                    st.markdown(table_md)
-            except Exception as e:
-                st.warning(f"No se pudo mostrar la tabla: {e}")
+        # Show a page of tickets (hide hashed_token) plus the maintained counters
+        store = get_ticket_store()
+        try:
+            st.subheader("Base de datos de tickets (solo lectura)")
+            col_event, col_date, col_estado, col_nombre = st.columns(4)
+            event_filter = col_event.selectbox("Evento", ["Todos"] + event_types())
+            date_filter = col_date.text_input("Fecha (YYYY-MM-DD)")
+            estado_filter = col_estado.selectbox("Estado", ["Todos", "valido", "invalido"])
+            nombre_filter = col_nombre.text_input("Nombre empieza con")
+            col_sort, col_order, col_page = st.columns(3)
+            sort_by = col_sort.selectbox("Ordenar por", ["generated_at", "nombre", "date", "event_type", "adults", "children", "estado"])
+            descending = col_order.selectbox("Orden", ["Descendente", "Ascendente"]) == "Descendente"
+            page_size = 50
+            page = col_page.number_input("Página", min_value=1, value=1, step=1)
+            rows, total_rows = query_tickets(
+                store.version(),
+                event_type=None if event_filter == "Todos" else event_filter,
+                date=date_filter.strip() or None,
+                estado=None if estado_filter == "Todos" else estado_filter,
+                nombre_prefix=nombre_filter.strip() or None,
+                sort_by=sort_by,
+                descending=descending,
+                offset=(page - 1) * page_size,
+                limit=page_size,
+            )
+            pages = max(1, (total_rows + page_size - 1) // page_size)
+            # Move 'nombre' to the first column
+            columns = ["nombre"] + [c for c in FIELDNAMES if c not in ("nombre", "hashed_token", "token_id")]
+            st.dataframe([{c: row[c] for c in columns} for row in rows], use_container_width=True, hide_index=True)
+            st.caption(f"Página {page} de {pages} · {total_rows} tickets")
+
+            # Show totals grouped by event_type
+            st.markdown("**Total de boletos vendidos:**")
+            table_md = "Evento | adultos | niños | boletos | check-ins\n---|---|---|---|---\n"
+            for row in store.totals_by_event():
+                table_md += f"{row['event_type']} | {row['adults']} | {row['children']} | {row['issued']} | {row['checked_in']}\n"
+            st.markdown(table_md)
+            with st.expander("Totales por fecha"):
+                st.dataframe(store.aggregates(), use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.warning(f"No se pudo mostrar la tabla: {e}")
+        with st.expander("Asistencia por evento"):
+            # Read from the columnar snapshot: only four mapped columns, no CSV parsing
+            from ticket_snapshot import load_snapshot, read_manifest, write_snapshot
+            if st.button("Actualizar instantánea"):
+                write_snapshot(CSV_FILE)
+            snapshot = load_snapshot(CSV_FILE, ["event_type", "adults", "children", "estado"], require_current=False)
+            if snapshot is None or not len(snapshot["adults"]):
+                st.caption("Aún no hay instantánea; se crea con la próxima sincronización.")
+            else:
+                party = snapshot["adults"] + snapshot["children"]
+                checked_in = snapshot["estado"] == "invalido"
+                attendance = []
+                for event in snapshot["event_type"].categories:
+                    in_event = snapshot["event_type"] == event
+                    attendance.append({
+                        "Evento": event,
+                        "Personas": int(party[in_event].sum()),
+                        "Personas que ya entraron": int(party[in_event & checked_in].sum()),
+                    })
+                st.dataframe(attendance, use_container_width=True, hide_index=True)
+                st.write("Boletos por tamaño de grupo")
+                import numpy as np
+                st.bar_chart(np.bincount(party))
+                written_at = datetime.fromtimestamp(read_manifest(CSV_FILE)["written_at"]).strftime("%H:%M:%S")
+                st.caption(f"Instantánea de las {written_at}")
+        with st.expander("Métricas de rendimiento"):
+            import metrics
+            data = metrics.snapshot()
+            if not metrics.ENABLED:
+                st.info("Las métricas están desactivadas (TICKET_METRICS=0).")
+            elif data["timers"]:
+                st.dataframe(data["timers"], use_container_width=True, hide_index=True)
+                st.dataframe(
+                    [{"contador": c["name"], **c["labels"], "valor": c["value"]} for c in data["counters"]],
+                    use_container_width=True, hide_index=True,
+                )
+                st.download_button("Descargar métricas (Prometheus)", metrics.prometheus_text(),
+                                   file_name="metrics.txt", mime="text/plain")
+            else:
+                st.caption("Sin operaciones registradas en este proceso todavía.")
+        with st.expander("Reimprimir boleto"):
+            reprint_id = st.text_input("Token ID del boleto").strip()
+            if reprint_id:
+                ticket = store.get_by_token_id(reprint_id)
+                if not ticket:
+                    st.error("No existe un boleto con ese Token ID.")
+                else:
+                    renderer = get_renderer()
+                    stored = ticket.get("ticket_filename") or ""
+                    if stored and os.path.exists(stored):
+                        with open(stored, "rb") as f:
+                            data = f.read()
+                        file_name = os.path.basename(stored)
+                        mime = renderer.IMAGE_FORMATS[renderer.format_for(stored)]["mime"]
+                    else:
+                        # No stored image (on-demand mode or deleted file): render it from the row
+                        data = renderer.ticket_row_image(ticket)
+                        spec = renderer.IMAGE_FORMATS[renderer.IMAGE_FORMAT]
+                        file_name = f"ticket_{ticket['event_type']}_{ticket['date']}_{reprint_id[:8]}{spec['ext']}"
+                        mime = spec["mime"]
+                    st.image(data, caption=ticket.get("nombre") or reprint_id, use_container_width=True)
+                    st.download_button("Descargar boleto", data, file_name=file_name, mime=mime)
         st.divider()      
         st.write("Descarga o sube la lista de tickets.")
         # Download button
         if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, "rb") as f:
-                st.download_button("Descargar tickets.csv", f, file_name="tickets.csv", mime="text/csv")
+            st.download_button("Descargar tickets.csv", store.read_csv_bytes(), file_name="tickets.csv", mime="text/csv")
         else:
             st.info("No existe tickets.csv aún.")
         # Upload button
         uploaded = st.file_uploader("Subir nuevo tickets.csv", type=["csv"])
         if uploaded is not None:
-            st.warning("¿Seguro que deseas sobrescribir la lista de tickets? Se hará un respaldo antes de sobrescribir.")
-            if st.button("Confirmar y sobrescribir"): 
-                # Make backup
-                import shutil
-                backup_folder = "backup"
-                os.makedirs(backup_folder, exist_ok=True)
-                if os.path.exists(CSV_FILE):
+            from ticket_import import apply_upload, diff_upload
+            # Validate and diff once per uploaded file, not on every rerun
+            preview = st.session_state.get("import_preview")
+            if preview is None or preview[0] != uploaded.file_id:
+                with st.spinner("Validando archivo..."):
+                    preview = (uploaded.file_id, *diff_upload(uploaded, CSV_FILE))
+                st.session_state["import_preview"] = preview
+            _, diff, errors = preview
+            if errors:
+                st.error("El archivo no se puede importar:\n\n" + "\n".join(f"- {e}" for e in errors))
+            elif not (diff["added"] or diff["changed"] or diff["removed"]):
+                st.info(f"El archivo coincide con tickets.csv ({diff['unchanged']} tickets); no hay cambios que aplicar.")
+            else:
+                st.warning(f"Se aplicarán estos cambios a tickets.csv: {len(diff['added'])} nuevos, "
+                           f"{len(diff['changed'])} modificados, {len(diff['removed'])} eliminados "
+                           f"({diff['unchanged']} sin cambios). Se hará un respaldo antes.")
+                if diff["removed"]:
+                    st.caption("Los tickets eliminados sólo se borran en este dispositivo.")
+                if st.button("Confirmar y aplicar cambios"):
+                    # Make backup
+                    backup_folder = "backup"
+                    os.makedirs(backup_folder, exist_ok=True)
                     backup_path = os.path.join(backup_folder, f"tickets_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-                    shutil.copy2(CSV_FILE, backup_path)
-                    st.info(f"Respaldo guardado en {backup_path}")
-                # Overwrite
-                with open(CSV_FILE, "wb") as f:
-                    f.write(uploaded.read())
-                st.success("tickets.csv sobrescrito correctamente.")
-                st.experimental_rerun()
+                    if store.snapshot_csv(backup_path):
+                        st.info(f"Respaldo guardado en {backup_path}")
+                    # Only the diff touches the index and aggregates; delta sync pushes only the changed tickets
+                    apply_upload(diff, CSV_FILE)
+                    get_sync().request_sync()
+                    del st.session_state["import_preview"]
+                    st.success("tickets.csv actualizado correctamente.")
+                    st.rerun()
         st.stop()
     elif tab == "Generar Ticket":    
         st.title("Generador de tickets digitales")
@@ -325,7 +287,7 @@ def main():
 
         nombre = st.text_input("Nombre (opcional)")
         email = st.text_input("Email (opcional)")
-        event_type = st.selectbox("Evento", EVENT_TYPES)
+        event_type = st.selectbox("Evento", event_types())
         date = st.date_input("Día de compra", value=datetime.now()).strftime("%Y-%m-%d")
         adults = st.number_input("Número de Adultos", min_value=0, value=1, step=1)
         children = st.number_input("Número of niños", min_value=0, value=0, step=1)
@@ -338,28 +300,113 @@ def main():
             else:
                 hashed_token, token_id = generate_token(event_type, date, adults, children)
                 gen_time = datetime.now().isoformat()
-                # Determine folder by event type
-                folder = f"tickets/{event_type}/"
-                os.makedirs(folder, exist_ok=True)
-                filename = os.path.join(folder, f"ticket_{event_type}_{date}_{gen_time.replace(':','-').replace('.','-')}.png")
-                create_ticket_image(hashed_token, filename,event_type,adults,children,nombre)
-                save_ticket_info(hashed_token, token_id, event_type, date, adults, children, gen_time, filename, nombre, email, comentarios)
-                st.success(f"Ticket generado y guardado como {filename}\n Token ID: {token_id}")
-                upload_csv(CSV_FILE)    # Safely merges and uploads
-                if os.path.exists(filename):
-                    st.image(filename, caption="Ticket Generado", use_container_width=True)
-                    with open(filename, "rb") as img_file:
-                        btn = st.download_button(
-                            label="Descargar",
-                            data=img_file,
-                            file_name=os.path.basename(filename),
-                            mime="image/png"
-                        )
+                renderer = get_renderer()
+                spec = renderer.IMAGE_FORMATS[renderer.IMAGE_FORMAT]
+                if renderer.IMAGE_STORAGE == "on_demand":
+                    # No file per ticket; the image is rendered from the row when needed
+                    save_ticket_info(hashed_token, token_id, event_type, date, adults, children, gen_time, "", nombre, email, comentarios)
+                    st.success(f"Ticket generado.\n Token ID: {token_id}")
+                    get_sync().request_sync()    # Syncs in the background, never blocks the sale
+                    data = renderer.ticket_image_bytes(hashed_token, event_type, adults, children, nombre)
+                    st.image(data, caption="Ticket Generado", use_container_width=True)
+                    st.download_button(
+                        label="Descargar",
+                        data=data,
+                        file_name=f"ticket_{event_type}_{date}_{token_id[:8]}{spec['ext']}",
+                        mime=spec["mime"]
+                    )
+                else:
+                    # Determine folder by event type
+                    folder = event_folder(event_type)
+                    os.makedirs(folder, exist_ok=True)
+                    filename = os.path.join(folder, f"ticket_{event_type}_{date}_{gen_time.replace(':','-').replace('.','-')}{spec['ext']}")
+                    renderer.create_ticket_image(hashed_token, filename,event_type,adults,children,nombre, renderer.IMAGE_FORMAT)
+                    save_ticket_info(hashed_token, token_id, event_type, date, adults, children, gen_time, filename, nombre, email, comentarios)
+                    st.success(f"Ticket generado y guardado como {filename}\n Token ID: {token_id}")
+                    get_sync().request_sync()    # Syncs in the background, never blocks the sale
+                    if os.path.exists(filename):
+                        st.image(filename, caption="Ticket Generado", use_container_width=True)
+                        with open(filename, "rb") as img_file:
+                            btn = st.download_button(
+                                label="Descargar",
+                                data=img_file,
+                                file_name=os.path.basename(filename),
+                                mime=spec["mime"]
+                            )
     
     elif tab == "Check-in":
         st.header("Check-in de tickets")
         st.write("Escanea el código QR con el lector.")
 
+        # In-memory validation set for this gate, loaded once per process
+        from checkin_engine import REDEEMED, UNKNOWN, VALID, RecentScans
+        engine = get_gate_engine(os.environ.get("TICKET_GATE_ID", "gate"))
+        # Codes read again within a few seconds (camera still pointed at them) are not re-processed
+        if "recent_scans" not in st.session_state:
+            st.session_state["recent_scans"] = RecentScans(float(os.environ.get("TICKET_SCAN_DEBOUNCE", "3")))
+        recent_scans = st.session_state["recent_scans"]
+
+        def show_gate_error(e):
+            # With TICKET_CHECKIN_SERVER every engine call is a request (URLError, timeouts are OSError)
+            st.error(f"No se pudo contactar el servidor de check-in: {e}")
+
+        def show_gate_stats():
+            with st.expander("Estadísticas de la puerta"):
+                try:
+                    stats = engine.stats()
+                    st.write(f"Escaneos por minuto: {stats['scans_per_minute']}  |  p99: {stats['p99_ms']:.2f} ms  |  "
+                             f"Tickets cargados: {stats['tickets_loaded']}  |  Check-ins sin sincronizar: {engine.pending_count()}")
+                    if engine.conflicts:
+                        st.warning(f"{len(engine.conflicts)} tickets ya habían sido usados en otra puerta.")
+                    if st.button("Sincronizar check-ins"):
+                        engine.reconcile(reload=True)
+                        get_sync().request_sync()
+                        st.success("Check-ins sincronizados.")
+                except OSError as e:
+                    show_gate_error(e)
+
+        if st.toggle("Modo continuo", key="continuous_scan",
+                     help="La cámara queda encendida y cada código nuevo se registra automáticamente"):
+            from streamlit_qrcode_scanner import qrcode_scanner
+            # The component keeps returning its last code and stays silent when the same code
+            # is read again, so it gets a fresh key after every read; RecentScans decides repeats
+            reads = st.session_state.get("continuous_reads", 0)
+            scanned_value = qrcode_scanner(key=f"continuous_scanner_{reads}")
+            if scanned_value:
+                st.session_state["continuous_reads"] = reads + 1
+                st.session_state["continuous_result"] = None
+                try:
+                    result = recent_scans.get(scanned_value)
+                    repeated = result is not None
+                    if not repeated:
+                        result = engine.redeem(scanned_value)
+                        recent_scans.put(scanned_value, result)
+                        if engine.needs_reconcile():
+                            engine.reconcile()
+                            get_sync().request_sync()
+                    ticket = None
+                    if result == VALID:
+                        ticket = engine.ticket_details(scanned_value.strip())
+                    st.session_state["continuous_result"] = (result, repeated, ticket)
+                except OSError as e:
+                    st.session_state["checkin_error"] = str(e)
+                st.rerun()
+            if st.session_state.get("checkin_error"):
+                show_gate_error(st.session_state.pop("checkin_error"))
+            if st.session_state.get("continuous_result"):
+                result, repeated, ticket = st.session_state["continuous_result"]
+                if result == VALID:
+                    party = f" ({ticket.get('adults', '')} adultos, {ticket.get('children', '')} niños)" if ticket else ""
+                    st.success(f"Adelante: check-in registrado{party}.")
+                elif result == REDEEMED:
+                    st.error("Este ticket ya fue utilizado.")
+                else:
+                    st.error("Ticket NO encontrado o inválido.")
+                if repeated:
+                    st.caption("Lectura repetida del mismo código; no se volvió a procesar.")
+            show_gate_stats()
+            st.stop()
+
         # Initialize session state keys before creating widgets
         if "checkin_hashed_token" not in st.session_state:
             st.session_state["checkin_hashed_token"] = ""
@@ -373,6 +420,7 @@ def main():
             st.session_state["checkin_hashed_token"] = ""
             st.session_state["ticket_details"] = None
             st.session_state["checkin_confirmed"] = False
+            st.session_state["checkin_result"] = None
             # no direct modification of widget after instantiation outside callback
 
         def confirm_checkin():
@@ -382,29 +430,21 @@ def main():
                 st.session_state["checkin_confirmed"] = False
                 return
 
-            # update CSV
-            import csv, os
-            if not os.path.exists(CSV_FILE):
+            # redeem in memory; persisted to the gate journal and reconciled with the store later
+            try:
+                result = engine.redeem(token)
+                recent_scans.put(token, result)
+                st.session_state["checkin_result"] = result
+                if engine.needs_reconcile():
+                    engine.reconcile()
+                    get_sync().request_sync()
+            except OSError as e:
+                # Callbacks run before the page is drawn; the error is shown below the buttons
+                st.session_state["checkin_error"] = str(e)
                 st.session_state["checkin_confirmed"] = False
                 return
 
-            with open(CSV_FILE, newline="", encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile, delimiter=";")
-                rows = list(reader)
-                fieldnames = reader.fieldnames
-
-            updated = False
-            for row in rows:
-                if row.get("hashed_token") == token:
-                    row["estado"] = "invalido"
-                    updated = True
-                    break
-
-            if updated:
-                with open(CSV_FILE, mode="w", newline="", encoding="utf-8") as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=";")
-                    writer.writeheader()
-                    writer.writerows(rows)
+            if result == VALID:
                 # clear widget-backed key via session state (allowed inside callback)
                 st.session_state["checkin_hashed_token"] = ""
                 st.session_state["ticket_details"] = None
@@ -433,28 +473,41 @@ def main():
         # Conditionally display the camera component
         if st.session_state.is_scanning:
             # The component returns the scanned value directly
+            from streamlit_qrcode_scanner import qrcode_scanner
             scanned_value = qrcode_scanner(key='my_scanner')
             
             # MODIFIED: Store the scanned value in the temporary variable.
             # This does not cause a conflict because temp_scanned_value is not tied to a widget key.
-            if scanned_value:
+            if scanned_value and recent_scans.get(scanned_value) is not None:
+                st.info("Este código se acaba de procesar; lectura repetida ignorada.")
+            elif scanned_value:
                 st.session_state.temp_scanned_value = scanned_value
                 stop_scanning()
                 st.rerun()
                 
         # Validate ticket (this sets ticket_details; doesn't modify the widget key)
         if st.button("Validar Ticket"):
+            st.session_state["checkin_result"] = None  # the previous ticket's outcome
             hashed_token = st.session_state.get("checkin_hashed_token", "")
             if not hashed_token:
                 st.warning("Por favor, ingresa el código escaneado.")
             else:
-                ticket = find_ticket_by_hash(hashed_token, CSV_FILE)
+                ticket = estado = None
+                try:
+                    estado = engine.validate(hashed_token)
+                    if estado != UNKNOWN:
+                        # Signed tickets carry event and party size themselves (see ticket_details)
+                        ticket = engine.ticket_details(hashed_token.strip())
+                except OSError as e:
+                    st.session_state["ticket_details"] = None
+                    show_gate_error(e)
                 if ticket:
+                    ticket["estado"] = estado  # includes redemptions not yet reconciled
                     st.session_state["ticket_details"] = ticket
                     st.session_state["checkin_confirmed"] = False
                     st.success("Ticket encontrado:")
                     # Format generated_at to show only date (YYYY-MM-DD)
-                    gen_at = ticket.get('generated_at', '')
+                    gen_at = ticket.get('generated_at') or ticket.get('date', '')
                     gen_date = gen_at
                     try:
                         if gen_at:
@@ -466,6 +519,7 @@ def main():
                             gen_date = gen_at.split('T')[0]
 
                     st.markdown(f"""
+                        **Evento:** {ticket.get('event_type', '')}  
                         **Nombre:** {ticket.get('nombre', '')}  
                         **Adultos:** {ticket.get('adults', '')}  
                         **Niños:** {ticket.get('children', '')}  
@@ -473,7 +527,7 @@ def main():
                         **Comentarios:** {ticket.get('comentarios', '')}  
                         **Estado:** {ticket.get('estado', '')}
                     """)
-                else:
+                elif estado is not None:
                     st.session_state["ticket_details"] = None
                     st.error("Ticket NO encontrado o inválido.")
 
@@ -482,8 +536,14 @@ def main():
             st.button("Confirmar Check-in", on_click=confirm_checkin)
 
         # Show success message if confirmation completed
-        if st.session_state.get("checkin_confirmed"):
+        if st.session_state.get("checkin_error"):
+            show_gate_error(st.session_state.pop("checkin_error"))
+        elif st.session_state.get("checkin_confirmed"):
             st.success("Check-in confirmado. El estado del ticket ha sido actualizado a 'invalido'.")
+        elif st.session_state.get("checkin_result") == REDEEMED:
+            st.error("Este ticket ya fue utilizado.")
+
+        show_gate_stats()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+import csv
+import io
+
+from event_registry import get_event
+from metrics import timed
+from ticket_issuance import validate_inputs
+from ticket_store import FIELDNAMES, get_store
+
+# Stop listing problems after this many rows; the import is rejected anyway
+MAX_ERRORS = 20
+ESTADOS = ("valido", "invalido")
+
+
+def iter_upload_rows(binary_file, errors, max_errors=MAX_ERRORS, retired=None):
+    """Yield the rows of an uploaded tickets.csv in FIELDNAMES order, validating as they stream.
+
+    The file is read through a text wrapper in buffered chunks, never as a
+    whole. Problems are appended to errors ("Fila N: ..."); invalid rows
+    are skipped, so callers must check errors before using the result.
+    retired maps event types no longer in events.json to the hashed_tokens
+    already sold for them; only those tickets may keep such an event.
+    """
+    retired = retired or {}
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text, delimiter=";")
+        header = [name.strip() for name in next(reader, [])]
+        if not header:
+            errors.append("El archivo está vacío.")
+            return
+        if len(header) == 1 and ("," in header[0] or "\t" in header[0]):
+            errors.append("El archivo debe usar ';' como separador, igual que tickets.csv.")
+            return
+        missing = [name for name in FIELDNAMES if name not in header]
+        if missing:
+            errors.append(f"Faltan columnas: {', '.join(missing)}")
+            return
+        index = [header.index(name) for name in FIELDNAMES]
+        seen = set()
+        checked = {}  # (event_type, date, adults, children) -> problems; few distinct values
+        for line_no, raw in enumerate(reader, start=2):
+            if not raw:
+                continue
+            if len(raw) != len(header):
+                problems = [f"se esperaban {len(header)} columnas, hay {len(raw)}"]
+            else:
+                row = [raw[i] for i in index]
+                # Same checks as a sale (see save_ticket_info), plus the columns the app fills in
+                key = (row[2], row[3], row[4], row[5])
+                if key not in checked:
+                    # Rows were issued already; the signed-token limits only apply to new tokens
+                    checked[key] = validate_inputs(*key, token_format="compact", extra_event_types=retired)
+                problems = list(checked[key])
+                if row[2] in retired and row[0] not in retired[row[2]]:
+                    problems.append("Invalid event type.")
+                if not row[0] or not row[1]:
+                    problems.append("hashed_token y token_id son obligatorios")
+                elif row[0] in seen:
+                    problems.append("hashed_token repetido")
+                if row[11] not in ESTADOS:
+                    problems.append(f"estado debe ser {' o '.join(ESTADOS)}")
+            if problems:
+                if len(errors) < max_errors:
+                    errors.append(f"Fila {line_no}: {'; '.join(problems)}")
+                continue
+            seen.add(row[0])
+            yield row
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append(f"No se pudo leer el archivo: {e}")
+    finally:
+        text.detach()
+
+
+@timed("import_diff")
+def diff_upload(binary_file, csv_file):
+    """Validate an uploaded tickets.csv and diff it against the store.
+
+    Returns (diff, errors); diff is None when the file has errors. See
+    TicketStore.diff_rows for the diff layout.
+    """
+    errors = []
+    binary_file.seek(0)
+    store = get_store(csv_file)
+    # Events removed from events.json stay valid for the tickets already sold for them
+    retired = store.tokens_by_event([row["event_type"] for row in store.totals_by_event() if get_event(row["event_type"]) is None])
+    diff = store.diff_rows(iter_upload_rows(binary_file, errors, retired=retired))
+    return (None, errors) if errors else (diff, errors)
+
+
+@timed("import_apply")
+def apply_upload(diff, csv_file):
+    """Apply a diff from diff_upload to tickets.csv and its index."""
+    get_store(csv_file).apply_diff(diff)
@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime
+
+from event_registry import event_types, get_event
+from metrics import timed
+from ticket_store import get_store
+from ticket_tokens import SIGNED_EPOCH, SIGNED_LAST_DATE, SIGNED_MAX_PEOPLE, TOKEN_FORMAT, has_token_key, new_token
+
+# Constants
+EVENT_TYPES = event_types()  # from events.json, see event_registry
+CSV_FILE = "tickets.csv"
+
+
+def validate_inputs(event_type, date, adults, children, token_format=None, extra_event_types=()):
+    """Return a list of problems with a ticket's fields (empty when it can be issued).
+
+    extra_event_types are accepted besides the events in the registry. With
+    the signed token format the fields must also fit the S1 claims.
+    """
+    errors = []
+    if get_event(event_type) is None and event_type not in extra_event_types:
+        errors.append("Invalid event type.")
+    counts = []
+    for label, value in (("Adults", adults), ("Children", children)):
+        try:
+            value = int(value)
+            if value < 0:
+                errors.append(f"{label} must be 0 or more.")
+            counts.append(value)
+        except ValueError:
+            errors.append(f"{label} must be an integer.")
+    try:
+        parsed_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        errors.append("Date must be in YYYY-MM-DD format.")
+        parsed_date = None
+    if (token_format or TOKEN_FORMAT) == "signed":
+        if not has_token_key():
+            errors.append("Signed tickets need TICKET_TOKEN_KEY.")
+        if any(count > SIGNED_MAX_PEOPLE for count in counts):
+            errors.append(f"Signed tickets hold at most {SIGNED_MAX_PEOPLE} adults and {SIGNED_MAX_PEOPLE} children.")
+        if parsed_date and not SIGNED_EPOCH <= parsed_date <= SIGNED_LAST_DATE:
+            errors.append(f"Signed tickets need a date between {SIGNED_EPOCH} and {SIGNED_LAST_DATE}.")
+    return errors
+
+
+@timed("generate_token")
+def generate_token(event_type, date, adults, children, csv_file=None, token_format=None):
+    # Ensure token_id is unique in tickets.csv
+    store = get_store(csv_file or CSV_FILE)
+
+    while True:
+        token_id = str(uuid.uuid4())
+        if not store.token_id_exists(token_id):
+            break
+    # Derive the QR payload from token_id (compact "T1...", signed "S1..." or legacy hex, see ticket_tokens)
+    hashed_token = new_token(token_id, token_format, event_type, date, adults, children)
+    return hashed_token, token_id
+
+
+@timed("save_ticket")
+def save_ticket_info(hashed_token, token_id, event_type, date, adults, children, gen_time, filename, nombre, email, comentarios, csv_file=None):
+    get_store(csv_file or CSV_FILE).add_ticket(ticket_row(
+        hashed_token, token_id, event_type, date, adults, children, gen_time, filename, nombre, email, comentarios
+    ))
+
+
+def save_tickets_bulk(rows, csv_file=None):
+    """Append many ticket rows (see ticket_row) to tickets.csv in a single write."""
+    get_store(csv_file or CSV_FILE).add_tickets(rows)
+
+
+def ticket_row(hashed_token, token_id, event_type, date, adults, children, gen_time, filename, nombre, email, comentarios):
+    return {
+        "hashed_token": hashed_token,
+        "token_id": token_id,
+        "event_type": event_type,
+        "date": date,
+        "adults": adults,
+        "children": children,
+        "generated_at": gen_time,
+        "ticket_filename": filename,
+        "nombre": nombre,
+        "email": email,
+        "comentarios": comentarios,
+        "estado": "valido",
+    }
@@ -0,0 +1,257 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+from event_registry import event_spec, event_types
+from metrics import timer
+from qr_encoder import TICKET_QR_ENCODER, QREncoder
+
+# Image encodings. "png" is the original full RGBA PNG; the others are much
+# smaller and faster to encode. The QR modules are 20+ px, so they survive
+# JPEG/WebP compression (see benchmarks/bench_encodings.py).
+IMAGE_FORMATS = {
+    "png": {"ext": ".png", "mime": "image/png"},
+    "png-palette": {"ext": ".png", "mime": "image/png"},
+    "webp": {"ext": ".webp", "mime": "image/webp"},
+    "jpeg": {"ext": ".jpg", "mime": "image/jpeg"},
+}
+# "files" saves an image per ticket under tickets/; "on_demand" stores none and
+# renders from the ticket row whenever the image is needed
+IMAGE_STORAGE = os.environ.get("TICKET_IMAGE_STORAGE", "files")
+IMAGE_FORMAT = os.environ.get("TICKET_IMAGE_FORMAT", "jpeg" if IMAGE_STORAGE == "on_demand" else "png")
+# Upper bound for the cache of encoded on-demand images
+IMAGE_CACHE_BYTES = int(float(os.environ.get("TICKET_IMAGE_CACHE_MB", "64")) * 1024 * 1024)
+
+# event_type -> compiled render template (decoded assets and fixed positions),
+# reused by every ticket rendered in this process
+_templates = {}
+_asset_lock = threading.Lock()
+# QR box size -> encoder
+_encoders = {TICKET_QR_ENCODER.target_px: TICKET_QR_ENCODER}
+# (ticket fields, format, background mtime) -> encoded bytes, least recently used first
+_image_cache = OrderedDict()
+_image_cache_lock = threading.Lock()
+_image_cache_size = 0
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _load_font(font_spec):
+    # Try to use a truetype font if available, else default
+    for font_path in font_spec["candidates"]:
+        try:
+            return ImageFont.truetype(font_path, font_spec["size"]), font_path
+        except Exception:
+            continue
+    return ImageFont.load_default(), None
+
+
+def _encoder(size):
+    encoder = _encoders.get(size)
+    if encoder is None:
+        encoder = _encoders[size] = QREncoder(target_px=size)
+    return encoder
+
+
+def _compile_template(spec, bg_mtime):
+    bg_file = spec["background"]
+    if bg_mtime is None:
+        # Create a placeholder background if not found
+        bg = Image.new("RGBA", (600, 400), (255, 255, 255, 255))
+    else:
+        print(f"[TicketGen] Loading {bg_file} for {spec['name']}")
+        bg = Image.open(bg_file).convert("RGBA")
+    font, font_path = _load_font(spec["font"])
+    qr, text = spec["qr"], spec["text"]
+    center_x, center_y = qr["center"] or (bg.width / 2, bg.height / 2)
+    # Tallest line the font can draw, so every line gets the same fixed height
+    line_height = ImageDraw.Draw(bg).textbbox((0, 0), "ÁÑgjy|", font=font)[3]
+    return {
+        "spec": spec,
+        "bg_mtime": bg_mtime,
+        "background": bg,
+        "font": font,
+        "font_path": font_path,
+        "font_mtime": _mtime(font_path) if font_path else None,
+        "encoder": _encoder(qr["size"]),
+        "qr_center": (center_x + qr["offset"][0], center_y + qr["offset"][1]),
+        "qr_positions": {},  # QR mask size -> top-left corner
+        "line_height": line_height,
+        "text_color": tuple(text["color"]),
+        "box_color": tuple(text["box_color"]),
+    }
+
+
+def get_template(event_type):
+    """Return the compiled render template of an event, rebuilding it only when its files change.
+
+    The background is shared: callers must draw on a .copy() of it.
+    """
+    spec = event_spec(event_type)
+    bg_mtime = _mtime(spec["background"]) if spec["background"] else None
+    with _asset_lock:
+        template = _templates.get(event_type)
+        if (
+            template is None
+            or template["spec"] is not spec
+            or template["bg_mtime"] != bg_mtime
+            or (template["font_path"] and template["font_mtime"] != _mtime(template["font_path"]))
+        ):
+            template = _templates[event_type] = _compile_template(spec, bg_mtime)
+        return template
+
+
+def compile_templates():
+    """Build the templates of every registered event up front (app and batch start-up)."""
+    for event_type in event_types():
+        get_template(event_type)
+
+
+def clear_asset_cache():
+    global _image_cache_size
+    with _asset_lock:
+        _templates.clear()
+    with _image_cache_lock:
+        _image_cache.clear()
+        _image_cache_size = 0
+
+
+def _event_palette(event_type):
+    # 254 colors fitted to the background once per event, plus exact black and white for the QR
+    template = get_template(event_type)
+    with _asset_lock:
+        if "palette" not in template:
+            colors = template["background"].convert("RGB").quantize(254, method=Image.Quantize.FASTOCTREE).getpalette()[:254 * 3]
+            colors += [0] * (254 * 3 - len(colors))
+            palette = Image.new("P", (1, 1))
+            palette.putpalette(colors + [0, 0, 0, 255, 255, 255])
+            template["palette"] = palette
+        return template["palette"]
+
+
+def encode_ticket(image, event_type, fmt="png"):
+    """Encode a render_ticket() image in one of IMAGE_FORMATS and return the bytes."""
+    out = io.BytesIO()
+    with timer(f"render_encode_{fmt}"):
+        if fmt == "png":
+            image.save(out, "PNG")
+        elif fmt == "png-palette":
+            image.convert("RGB").quantize(palette=_event_palette(event_type), dither=Image.Dither.NONE).save(out, "PNG")
+        elif fmt == "webp":
+            image.convert("RGB").save(out, "WEBP", quality=80, method=0)
+        elif fmt == "jpeg":
+            # The QR is black on white, so chroma subsampling leaves it intact
+            image.convert("RGB").save(out, "JPEG", quality=85)
+        else:
+            raise ValueError(f"Unknown image format: {fmt}")
+    return out.getvalue()
+
+
+def format_for(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return {".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}.get(ext, "png")
+
+
+def create_ticket_image(token, output_filename,event_type,adults, children,nombre, fmt=None):
+    with timer("render"):
+        image = render_ticket(token, event_type, adults, children, nombre)
+    data = encode_ticket(image, event_type, fmt or format_for(output_filename))
+    with open(output_filename, "wb") as f:
+        f.write(data)
+
+
+def ticket_image_bytes(token, event_type, adults, children, nombre, fmt=None):
+    """Render a ticket on demand, through a bounded LRU cache of encoded images.
+
+    Rendering is deterministic, so the same ticket fields always give the
+    same image; the cache only saves the work for downloads and re-sends.
+    """
+    global _image_cache_size
+    fmt = fmt or IMAGE_FORMAT
+    background = event_spec(event_type)["background"]
+    key = (token, event_type, str(adults), str(children), nombre or "", fmt, background and _mtime(background))
+    with _image_cache_lock:
+        data = _image_cache.get(key)
+        if data is not None:
+            _image_cache.move_to_end(key)
+            return data
+    with timer("render"):
+        image = render_ticket(token, event_type, adults, children, nombre)
+    data = encode_ticket(image, event_type, fmt)
+    with _image_cache_lock:
+        if key not in _image_cache and len(data) <= IMAGE_CACHE_BYTES:
+            _image_cache[key] = data
+            _image_cache_size += len(data)
+            while _image_cache_size > IMAGE_CACHE_BYTES:
+                _, evicted = _image_cache.popitem(last=False)
+                _image_cache_size -= len(evicted)
+    return data
+
+
+def ticket_row_image(row, fmt=None):
+    """On-demand image for a stored ticket row (dict with the tickets.csv columns)."""
+    return ticket_image_bytes(row["hashed_token"], row["event_type"], row["adults"], row["children"],
+                              row.get("nombre", ""), fmt)
+
+
+def _qr_position(template, size, bg_size):
+    position = template["qr_positions"].get(size)
+    if position is None:
+        # Centered on the event's QR box, but never out of the background
+        (center_x, center_y), (qr_w, qr_h), (bg_w, bg_h) = template["qr_center"], size, bg_size
+        position = (min(max(0, int(center_x - qr_w / 2)), bg_w - qr_w),
+                    min(max(0, int(center_y - qr_h / 2)), bg_h - qr_h))
+        template["qr_positions"][size] = position
+    return position
+
+
+def render_ticket(token, event_type, adults, children, nombre):
+    """Compose the ticket image in memory from the event's template and return it."""
+    template = get_template(event_type)
+    bg = template["background"].copy()
+    text = template["spec"]["text"]
+
+    # QR modules are rendered straight at the final size (no resampling)
+    qr_mask = template["encoder"].render_mask(token)
+    pos = _qr_position(template, qr_mask.size, bg.size)
+    QREncoder.paste(bg, qr_mask, pos)
+
+    # Draw adults/children count and nombre (if present) under QR code
+    try:
+        draw = ImageDraw.Draw(bg)
+        font = template["font"]
+        lines = [f"Adultos: {adults}  Niños: {children}"]
+        if nombre and str(nombre).strip():
+            lines.append(f"{nombre}")
+
+        # Fixed line height from the template; only the widths depend on the text
+        bg_w, bg_h = bg.size
+        line_h = template["line_height"]
+        widths = [int(font.getlength(line)) for line in lines]
+        total_height = len(lines) * line_h + (len(lines) - 1) * text["line_spacing"]
+        start_y = text["top"] if text["top"] is not None else pos[1] + qr_mask.height + text["gap"]
+        if start_y + total_height > bg_h:
+            start_y = bg_h - total_height - text["gap"]
+
+        # Background rectangle for all lines, then each line centered
+        max_width = max(widths)
+        padding = text["padding"]
+        draw.rectangle([((bg_w - max_width) // 2 - padding, start_y - padding // 2),
+                        ((bg_w + max_width) // 2 + padding, start_y + total_height + padding // 2)],
+                       fill=template["box_color"])
+        y = start_y
+        for line, width in zip(lines, widths):
+            draw.text(((bg_w - width) // 2, y), line, fill=template["text_color"], font=font)
+            y += line_h + text["line_spacing"]
+    except Exception as e:
+        print(f"[TicketGen] Failed to draw text: {e}")
+
+    return bg
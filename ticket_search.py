@@ -1,12 +1,8 @@
-import csv
-import os
+from metrics import timed
+from ticket_store import get_store
+from ticket_tokens import normalize_token
 
+@timed("lookup")
 def find_ticket_by_hash(hashed_token, csv_file="tickets.csv"):
-    if not os.path.exists(csv_file):
-        return None
-    with open(csv_file, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile, delimiter=';')
-        for row in reader:
-            if row.get('hashed_token') == hashed_token:
-                return row
-    return None
\ No newline at end of file
+    # Accepts both legacy 64-hex tokens and compact "T1..." tokens
+    return get_store(csv_file).get_by_hash(normalize_token(hashed_token))
@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from ticket_store import FIELDNAMES, get_store, replace_atomically
+
+# Columnar copy of tickets.csv for analytic and bulk reads: one .npy file per
+# column, opened with mmap so loading only maps the columns asked for.
+#   low-cardinality text (event_type, date, estado): uint16 codes + categories
+#   counts (adults, children): int32
+#   other text: fixed-width bytes when every value has the same length
+#               (tokens), otherwise UTF-8 blob + int64 offsets
+CATEGORICAL_COLUMNS = ("event_type", "date", "estado")
+INTEGER_COLUMNS = ("adults", "children")
+MANIFEST = "manifest.json"
+# Minimum seconds between background rebuilds (refresh_snapshot)
+SNAPSHOT_INTERVAL = float(os.environ.get("TICKETS_SNAPSHOT_INTERVAL", "60"))
+
+_write_lock = threading.Lock()
+
+
+class Categorical:
+    """Dictionary-encoded column: codes index into categories."""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def __eq__(self, value):
+        """Boolean mask of rows equal to value."""
+        if value not in self.categories:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == self.categories.index(value)
+
+    __hash__ = None
+
+    def tolist(self):
+        return np.array(self.categories, dtype=object)[self.codes].tolist() if self.categories else []
+
+
+class StringColumn:
+    """Variable-length UTF-8 column stored as one blob plus row offsets."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def tolist(self):
+        data = self.blob.tobytes()
+        bounds = self.offsets.tolist()
+        return [data[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+
+class FixedColumn:
+    """Text column whose values all have the same byte length."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i].decode("utf-8")
+
+    def tolist(self):
+        return np.char.decode(self.values, "utf-8").tolist() if len(self.values) else []
+
+
+def snapshot_dir(csv_file):
+    return os.path.splitext(csv_file)[0] + "_snapshot"
+
+
+def _save(path, array):
+    def write(temp_path):
+        with open(temp_path, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+    replace_atomically(path, write)
+
+
+def _load(path, rows):
+    # Empty files cannot be memory-mapped
+    return np.load(path, mmap_mode="r" if rows else None, allow_pickle=False)
+
+
+def _encode(directory, generation, name, values):
+    prefix = os.path.join(directory, f"{name}.{generation}")
+    if name in CATEGORICAL_COLUMNS:
+        categories = sorted(set(values))
+        index = {value: code for code, value in enumerate(categories)}
+        _save(prefix + ".codes.npy", np.fromiter((index[v] for v in values), dtype=np.uint16, count=len(values)))
+        return {"encoding": "categorical", "categories": categories}
+    if name in INTEGER_COLUMNS:
+        ints = np.fromiter((int(v) if str(v).lstrip("-").isdigit() else 0 for v in values), dtype=np.int32, count=len(values))
+        _save(prefix + ".npy", ints)
+        return {"encoding": "int32"}
+    encoded = [str(v).encode("utf-8") for v in values]
+    widths = {len(v) for v in encoded}
+    if len(widths) == 1 and 0 not in widths:
+        _save(prefix + ".npy", np.array(encoded, dtype=f"S{widths.pop()}"))
+        return {"encoding": "fixed"}
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in encoded], out=offsets[1:])
+    _save(prefix + ".offsets.npy", offsets)
+    _save(prefix + ".blob.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    return {"encoding": "blob"}
+
+
+def read_manifest(csv_file):
+    try:
+        with open(os.path.join(snapshot_dir(csv_file), MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(csv_file):
+    """Rebuild the snapshot of a ticket store if it is stale. Returns True when written."""
+    store = get_store(csv_file)
+    directory = snapshot_dir(csv_file)
+    with _write_lock:
+        manifest = read_manifest(csv_file)
+        signature, rows = store.export_rows()
+        if manifest and manifest["signature"] == signature:
+            return False
+        os.makedirs(directory, exist_ok=True)
+        generation = (manifest["generation"] + 1) if manifest else 1
+        columns = {name: _encode(directory, generation, name, [row[i] for row in rows])
+                   for i, name in enumerate(FIELDNAMES)}
+        new_manifest = {"signature": signature, "generation": generation, "rows": len(rows),
+                        "written_at": time.time(), "columns": columns}
+
+        def write_manifest(temp_path):
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(new_manifest, f)
+
+        replace_atomically(os.path.join(directory, MANIFEST), write_manifest)
+        # Keep the previous generation for readers that opened the old manifest
+        for name in os.listdir(directory):
+            parts = name.split(".")
+            if len(parts) > 2 and parts[1].isdigit() and int(parts[1]) < generation - 1:
+                os.remove(os.path.join(directory, name))
+    return True
+
+
+def refresh_snapshot(csv_file, min_interval=SNAPSHOT_INTERVAL):
+    """Rebuild a stale snapshot unless the current one is younger than min_interval seconds."""
+    manifest = read_manifest(csv_file)
+    if manifest and time.time() - manifest.get("written_at", 0) < min_interval:
+        return False
+    return write_snapshot(csv_file)
+
+
+def load_snapshot(csv_file, columns=None, require_current=True):
+    """Map the requested columns of the snapshot (all by default).
+
+    Returns {column: array-like} or None when there is no snapshot or, with
+    require_current, when tickets.csv or its check-ins changed since it was
+    written.
+    """
+    manifest = read_manifest(csv_file)
+    if manifest is None:
+        return None
+    if require_current and manifest["signature"] != get_store(csv_file).file_signature():
+        return None
+    directory = snapshot_dir(csv_file)
+    rows = manifest["rows"]
+    result = {}
+    for name in columns or FIELDNAMES:
+        spec = manifest["columns"][name]
+        prefix = os.path.join(directory, f"{name}.{manifest['generation']}")
+        if spec["encoding"] == "categorical":
+            result[name] = Categorical(_load(prefix + ".codes.npy", rows), spec["categories"])
+        elif spec["encoding"] == "int32":
+            result[name] = _load(prefix + ".npy", rows)
+        elif spec["encoding"] == "fixed":
+            result[name] = FixedColumn(_load(prefix + ".npy", rows))
+        else:
+            result[name] = StringColumn(_load(prefix + ".offsets.npy", rows), _load(prefix + ".blob.npy", rows))
+    return result
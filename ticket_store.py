@@ -0,0 +1,565 @@
+import csv
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from checkin_journal import CheckinJournal
+
+# Journal size (bytes) above which check-ins are folded back into tickets.csv
+COMPACT_THRESHOLD = 64 * 1024
+
+# Column layout of tickets.csv (semicolon separated)
+FIELDNAMES = ["hashed_token", "token_id", "event_type", "date", "adults", "children", "generated_at", "ticket_filename", "nombre", "email", "comentarios", "estado"]
+
+
+# Insert a ticket, or overwrite it in place (an UPDATE, so the aggregate triggers see both sides)
+UPSERT_TICKET = (
+    f"INSERT INTO tickets ({', '.join(FIELDNAMES)}) VALUES ({', '.join('?' * len(FIELDNAMES))}) "
+    f"ON CONFLICT (hashed_token) DO UPDATE SET {', '.join(f'{name} = excluded.{name}' for name in FIELDNAMES[1:])}"
+)
+# Same, but a check-in is never reverted: an existing "invalido" estado wins
+UPSERT_KEEP_CHECKIN = (
+    f"INSERT INTO tickets ({', '.join(FIELDNAMES)}) VALUES ({', '.join('?' * len(FIELDNAMES))}) "
+    f"ON CONFLICT (hashed_token) DO UPDATE SET {', '.join(f'{name} = excluded.{name}' for name in FIELDNAMES[1:-1])}, "
+    "estado = CASE WHEN tickets.estado = 'invalido' THEN 'invalido' ELSE excluded.estado END"
+)
+
+
+class TicketStore:
+    """SQLite index over tickets.csv with O(1) lookups by hashed_token and token_id.
+
+    The CSV stays the interchange format (sync, download, upload). The store
+    re-imports it whenever it changes outside the store, e.g. after a sync.
+    Check-ins go to an append-only CheckinJournal that is folded in on read.
+    """
+
+    def __init__(self, csv_file="tickets.csv", db_path=None):
+        self.csv_file = csv_file
+        self.db_path = db_path or os.path.splitext(csv_file)[0] + ".db"
+        self.journal = CheckinJournal(os.path.splitext(csv_file)[0] + "_checkins.log")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        columns = ", ".join(f"{name} TEXT" for name in FIELDNAMES[1:])
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS tickets (hashed_token TEXT PRIMARY KEY, {columns})")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_token_id ON tickets (token_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_event_date ON tickets (event_type, date)")
+            # LIKE is case-insensitive, so only a NOCASE index serves the nombre prefix filter
+            self._conn.execute("DROP INDEX IF EXISTS idx_tickets_nombre")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_nombre_nocase ON tickets (nombre COLLATE NOCASE)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_generated_at ON tickets (generated_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Local change feed used by delta sync: one entry per issued, edited ("row") or re-stated ("estado") ticket
+            self._conn.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, hashed_token TEXT, kind TEXT)")
+            if "kind" not in [column[1] for column in self._conn.execute("PRAGMA table_info(changes)")]:
+                # Feeds created before edits were synced only carried check-ins
+                self._conn.execute("ALTER TABLE changes ADD COLUMN kind TEXT DEFAULT 'estado'")
+            # Signed tickets redeemed at a gate before their sale reached tickets.csv (see hold_redemptions)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS held_redemptions (hashed_token TEXT PRIMARY KEY)")
+            self._create_aggregates()
+        self.refresh()
+
+    def _create_aggregates(self):
+        # Dashboard counters per (event_type, date), kept current by triggers on every write path
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS aggregates (event_type TEXT, date TEXT, adults INTEGER DEFAULT 0, "
+            "children INTEGER DEFAULT 0, issued INTEGER DEFAULT 0, checked_in INTEGER DEFAULT 0, "
+            "PRIMARY KEY (event_type, date))"
+        )
+        add = (
+            "INSERT INTO aggregates (event_type, date) VALUES (NEW.event_type, NEW.date) ON CONFLICT DO NOTHING; "
+            "UPDATE aggregates SET adults = adults + CAST(NEW.adults AS INTEGER), "
+            "children = children + CAST(NEW.children AS INTEGER), issued = issued + 1, "
+            "checked_in = checked_in + (NEW.estado = 'invalido') "
+            "WHERE event_type = NEW.event_type AND date = NEW.date;"
+        )
+        remove = (
+            "UPDATE aggregates SET adults = adults - CAST(OLD.adults AS INTEGER), "
+            "children = children - CAST(OLD.children AS INTEGER), issued = issued - 1, "
+            "checked_in = checked_in - (OLD.estado = 'invalido') "
+            "WHERE event_type = OLD.event_type AND date = OLD.date;"
+        )
+        self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS tickets_agg_insert AFTER INSERT ON tickets BEGIN {add} END")
+        self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS tickets_agg_delete AFTER DELETE ON tickets BEGIN {remove} END")
+        self._conn.execute(f"CREATE TRIGGER IF NOT EXISTS tickets_agg_update AFTER UPDATE ON tickets BEGIN {remove} {add} END")
+        if self._get_meta("aggregates_built") is None:
+            # Databases created before the counters existed
+            self._conn.execute("DELETE FROM aggregates")
+            self._conn.execute(
+                "INSERT INTO aggregates SELECT event_type, date, SUM(CAST(adults AS INTEGER)), "
+                "SUM(CAST(children AS INTEGER)), COUNT(*), SUM(estado = 'invalido') FROM tickets GROUP BY event_type, date"
+            )
+            self._set_meta("aggregates_built", "1")
+
+    # --- CSV signature tracking ---
+    def _csv_signature(self):
+        if not os.path.exists(self.csv_file):
+            return ""
+        st = os.stat(self.csv_file)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            value = self._get_meta(key)
+        return default if value is None else value
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._set_meta(key, value)
+
+    def refresh(self):
+        """Re-import the CSV if it was modified outside the store and fold new check-ins."""
+        with self._lock, self.journal.locked(exclusive=False):
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        if self._csv_signature() != self._get_meta("csv_signature"):
+            self.import_csv(self.csv_file)
+        offset = int(self._get_meta("journal_offset") or 0)
+        if self.journal.size() < offset:
+            offset = 0  # journal was compacted by another process; events are idempotent
+        events, new_offset = self.journal.read_from(offset)
+        if new_offset != offset:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE tickets SET estado = ? WHERE hashed_token = ?",
+                    ((event[1], event[0]) for event in events),
+                )
+                self._set_meta("journal_offset", str(new_offset))
+
+    # --- Import / export ---
+    def import_csv(self, path):
+        """Replace the store contents with the rows of a semicolon CSV."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tickets")
+            if os.path.exists(path):
+                with open(path, newline="", encoding="utf-8") as csvfile:
+                    reader = csv.DictReader(csvfile, delimiter=";")
+                    self._conn.executemany(
+                        UPSERT_TICKET,
+                        ([row.get(name) or "" for name in FIELDNAMES] for row in reader if row.get("hashed_token")),
+                    )
+            if path == self.csv_file:
+                self._set_meta("csv_signature", self._csv_signature())
+                self._set_meta("journal_offset", "0")
+
+    def export_csv(self, path):
+        """Write every ticket to a semicolon CSV using the tickets.csv schema."""
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT {', '.join(FIELDNAMES)} FROM tickets ORDER BY rowid")
+
+            def write(temp_path):
+                with open(temp_path, "w", newline="", encoding="utf-8") as csvfile:
+                    writer = csv.writer(csvfile, delimiter=";")
+                    writer.writerow(FIELDNAMES)
+                    writer.writerows(tuple(row) for row in cursor)
+
+            replace_atomically(path, write)
+            if path == self.csv_file:
+                with self._conn:
+                    self._set_meta("csv_signature", self._csv_signature())
+
+    def rewrite_csv(self, write):
+        """Replace tickets.csv with the file write(temp_path) produces, holding the writer lock.
+
+        write may read the current tickets.csv (e.g. to merge it with a
+        remote copy); no ticket can be issued or checked in until the new
+        file is in place. Journaled check-ins are replayed onto the new file.
+        """
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            replace_atomically(self.csv_file, write)
+            self._refresh_locked()
+
+    def snapshot_csv(self, dest_path):
+        """Copy tickets.csv to dest_path without catching a write in progress."""
+        with self._lock, self.journal.locked(exclusive=False):
+            if os.path.exists(self.csv_file):
+                shutil.copyfile(self.csv_file, dest_path)
+                return True
+        return False
+
+    def read_csv_bytes(self):
+        """Return the contents of tickets.csv (b"" if missing), read under the shared lock."""
+        with self._lock, self.journal.locked(exclusive=False):
+            if not os.path.exists(self.csv_file):
+                return b""
+            with open(self.csv_file, "rb") as f:
+                return f.read()
+
+    def file_signature(self):
+        """Identify the on-disk state (tickets.csv plus journaled check-ins), stable across processes."""
+        with self._lock, self.journal.locked(exclusive=False):
+            return f"{self._csv_signature()}|{self.journal.size()}"
+
+    def export_rows(self):
+        """Return (file_signature, rows) with every ticket as a tuple in FIELDNAMES order."""
+        with self._lock, self.journal.locked(exclusive=False):
+            self._refresh_locked()
+            rows = self._conn.execute(f"SELECT {', '.join(FIELDNAMES)} FROM tickets ORDER BY rowid").fetchall()
+            return f"{self._csv_signature()}|{self.journal.size()}", [tuple(row) for row in rows]
+
+    # --- Lookups ---
+    def get_by_hash(self, hashed_token):
+        with self._lock:
+            self.refresh()
+            row = self._conn.execute("SELECT * FROM tickets WHERE hashed_token = ?", (hashed_token,)).fetchone()
+        return dict(row) if row else None
+
+    def get_by_token_id(self, token_id):
+        with self._lock:
+            self.refresh()
+            row = self._conn.execute("SELECT * FROM tickets WHERE token_id = ?", (token_id,)).fetchone()
+        return dict(row) if row else None
+
+    def token_id_exists(self, token_id):
+        with self._lock:
+            self.refresh()
+            row = self._conn.execute("SELECT 1 FROM tickets WHERE token_id = ?", (token_id,)).fetchone()
+        return row is not None
+
+    def ticket_states(self):
+        """Return [(hashed_token, estado)] for every ticket."""
+        with self._lock:
+            self.refresh()
+            return self._conn.execute("SELECT hashed_token, estado FROM tickets").fetchall()
+
+    # --- Dashboard ---
+    def aggregates(self):
+        """Return per (event_type, date) counts of adults, children, issued and checked-in tickets."""
+        with self._lock:
+            self.refresh()
+            cursor = self._conn.execute(
+                "SELECT event_type, date, adults, children, issued, checked_in FROM aggregates "
+                "WHERE issued > 0 ORDER BY event_type, date"
+            )
+            return [dict(row) for row in cursor]
+
+    def totals_by_event(self):
+        """Return the aggregates summed per event_type."""
+        totals = {}
+        for row in self.aggregates():
+            total = totals.setdefault(row["event_type"], {"event_type": row["event_type"], "adults": 0, "children": 0, "issued": 0, "checked_in": 0})
+            for key in ("adults", "children", "issued", "checked_in"):
+                total[key] += row[key]
+        return list(totals.values())
+
+    def tokens_by_event(self, event_types):
+        """Return {event_type: set of hashed_tokens} for the given event types."""
+        with self._lock:
+            self.refresh()
+            return {
+                event_type: {row[0] for row in self._conn.execute("SELECT hashed_token FROM tickets WHERE event_type = ?", (event_type,))}
+                for event_type in event_types
+            }
+
+    def count(self):
+        with self._lock:
+            self.refresh()
+            return self._conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+
+    def query(self, event_type=None, date=None, estado=None, nombre_prefix=None, sort_by=None, descending=False, offset=0, limit=50):
+        """Filter, sort and page tickets in SQLite. Returns (rows, total matching rows)."""
+        clauses, params = [], []
+        for column, value in (("event_type", event_type), ("date", date), ("estado", estado)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if nombre_prefix:
+            escaped = nombre_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("nombre LIKE ? ESCAPE '\\'")
+            params.append(escaped + "%")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if sort_by not in FIELDNAMES:
+            sort_by = "rowid"
+        elif sort_by in ("adults", "children"):
+            sort_by = f"CAST({sort_by} AS INTEGER)"
+        order = f"ORDER BY {sort_by} {'DESC' if descending else 'ASC'}"
+        with self._lock:
+            self.refresh()
+            total = self._conn.execute(f"SELECT COUNT(*) FROM tickets {where}", params).fetchone()[0]
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(FIELDNAMES)} FROM tickets {where} {order} LIMIT ? OFFSET ?", params + [limit, offset]
+            )
+            return [dict(row) for row in cursor], total
+
+    def version(self):
+        """Opaque value that changes whenever ticket data may have changed (for caches)."""
+        with self._lock:
+            self.refresh()
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            return f"{data_version}:{self._conn.total_changes}"
+
+    # --- Writes ---
+    def add_ticket(self, row):
+        """Append a ticket to tickets.csv and index it."""
+        self.add_tickets([row])
+
+    def add_tickets(self, rows, track=True):
+        """Append several tickets to tickets.csv in one write and index them.
+
+        track=False skips the change feed (used for rows pulled from a sync).
+        """
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            self._append_locked(rows, track)
+
+    def _append_locked(self, rows, track):
+        values = [[str(row.get(name, "")) for name in FIELDNAMES] for row in rows]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=";")
+        if not os.path.exists(self.csv_file) or os.path.getsize(self.csv_file) == 0:
+            writer.writerow(FIELDNAMES)
+        writer.writerows(values)
+        # One O_APPEND write, flushed before the index is updated
+        fd = os.open(self.csv_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, buffer.getvalue().encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        with self._conn:
+            self._conn.executemany(
+                UPSERT_TICKET,
+                values,
+            )
+            if track:
+                self._conn.executemany("INSERT INTO changes (hashed_token, kind) VALUES (?, 'row')", ((v[0],) for v in values))
+            self._set_meta("csv_signature", self._csv_signature())
+
+    def redeem(self, hashed_token):
+        """Mark a ticket as used exactly once, safe across threads and processes.
+
+        Returns "redeemed", "already_redeemed" or "not_found".
+        """
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            row = self._conn.execute("SELECT estado FROM tickets WHERE hashed_token = ?", (hashed_token,)).fetchone()
+            if not row:
+                return "not_found"
+            if row["estado"] == "invalido":
+                return "already_redeemed"
+            self._journal_locked([hashed_token], "invalido")
+        return "redeemed"
+
+    def redeem_many(self, hashed_tokens):
+        """redeem() for a batch under one lock and one journal write. Returns a result per token."""
+        results = []
+        redeemed = set()
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            for token in hashed_tokens:
+                row = self._conn.execute("SELECT estado FROM tickets WHERE hashed_token = ?", (token,)).fetchone()
+                if not row:
+                    results.append("not_found")
+                elif row["estado"] == "invalido" or token in redeemed:
+                    results.append("already_redeemed")
+                else:
+                    redeemed.add(token)
+                    results.append("redeemed")
+            if redeemed:
+                self._journal_locked([t for t, r in zip(hashed_tokens, results) if r == "redeemed"], "invalido")
+        return results
+
+    def hold_redemptions(self, hashed_tokens):
+        """Remember redemptions of tickets not in the store yet, so every gate on it sees them."""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO held_redemptions VALUES (?)", ((t,) for t in hashed_tokens))
+
+    def release_redemptions(self, hashed_tokens):
+        """Forget held redemptions that reached the ticket rows."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM held_redemptions WHERE hashed_token = ?", ((t,) for t in hashed_tokens))
+
+    def is_held(self, hashed_token):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM held_redemptions WHERE hashed_token = ?", (hashed_token,)).fetchone() is not None
+
+    def held_tokens(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT hashed_token FROM held_redemptions")]
+
+    def _journal_locked(self, hashed_tokens, estado, track=True):
+        self.journal.append_many([(token, estado) for token in hashed_tokens])
+        self._refresh_locked()
+        if track:
+            with self._conn:
+                self._conn.executemany("INSERT INTO changes (hashed_token, kind) VALUES (?, 'estado')", ((t,) for t in hashed_tokens))
+        if self.journal.size() > COMPACT_THRESHOLD:
+            self._compact_locked()
+
+    # --- Delta sync support ---
+    def changes_since(self, seq):
+        """Return (rows, last_seq) for tickets issued or changed after change seq.
+
+        Each row also has "change": "row" when the ticket was issued or
+        edited (receivers take every field), "estado" for a check-in only.
+        """
+        with self._lock:
+            self.refresh()
+            last = self._conn.execute("SELECT MAX(seq) FROM changes").fetchone()[0] or 0
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(f't.{name}' for name in FIELDNAMES)}, "
+                "CASE WHEN c.edited THEN 'row' ELSE 'estado' END AS change FROM tickets t JOIN "
+                "(SELECT hashed_token, MAX(kind = 'row') AS edited FROM changes WHERE seq > ? AND seq <= ? "
+                "GROUP BY hashed_token) c ON c.hashed_token = t.hashed_token",
+                (seq, last),
+            )
+            rows = [dict(row) for row in cursor]
+        return rows, last
+
+    def merge_rows(self, rows):
+        """Merge rows received from another device, keyed by hashed_token.
+
+        Unknown tickets are appended. Known tickets take every field of rows
+        marked "change": "row" (see changes_since), and only a check-in
+        ("invalido") from any other row; a check-in is never reverted.
+        Merged rows are not fed back into the change feed. Returns the number
+        of rows applied.
+        """
+        applied = 0
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            new_rows, edited = [], []
+            redeemed = {}  # insertion-ordered set
+            for row in rows:
+                token = row.get("hashed_token")
+                if not token:
+                    continue
+                local = self._conn.execute("SELECT * FROM tickets WHERE hashed_token = ?", (token,)).fetchone()
+                if local is None:
+                    new_rows.append(row)
+                elif row.get("change") == "row" and any((row.get(name) or "") != (local[name] or "") for name in FIELDNAMES[1:-1]):
+                    edited.append([row.get(name) or "" for name in FIELDNAMES])
+                elif row.get("estado") == "invalido" and local["estado"] != "invalido" and token not in redeemed:
+                    redeemed[token] = None
+            if redeemed:
+                self._journal_locked(list(redeemed), "invalido", track=False)
+                applied += len(redeemed)
+            if new_rows:
+                self._append_locked(new_rows, track=False)
+                applied += len(new_rows)
+            if edited:
+                # Edits change rows in place, so tickets.csv is rewritten once from the index
+                with self._conn:
+                    self._conn.executemany(UPSERT_KEEP_CHECKIN, edited)
+                self._compact_locked()
+                applied += len(edited)
+        return applied
+
+    # --- Diff import (admin upload) ---
+    def diff_rows(self, rows):
+        """Compare a full replacement ticket list with the store, keyed by hashed_token.
+
+        rows is an iterable of lists in FIELDNAMES order; it is streamed into
+        a temporary table, so it is read once and never held in memory.
+        Returns {"added": rows, "changed": rows, "removed": tokens, "unchanged": n}.
+        Like merge_rows, a check-in is never reverted: changed rows keep
+        "invalido", and a row whose only difference is an older "valido"
+        counts as unchanged.
+        """
+        estado = "CASE WHEN t.estado = 'invalido' THEN 'invalido' ELSE i.estado END"
+        differs = " OR ".join([f"i.{name} IS NOT t.{name}" for name in FIELDNAMES[1:-1]] + [f"{estado} IS NOT t.estado"])
+        with self._lock:
+            self.refresh()
+            self._conn.execute("DROP TABLE IF EXISTS temp.incoming")
+            self._conn.execute(f"CREATE TEMP TABLE incoming ({', '.join(f'{name} TEXT' for name in FIELDNAMES)})")
+            try:
+                self._conn.executemany(f"INSERT INTO temp.incoming VALUES ({', '.join('?' * len(FIELDNAMES))})", rows)
+                added = self._conn.execute(
+                    f"SELECT {', '.join(f'i.{name}' for name in FIELDNAMES)} FROM temp.incoming i "
+                    "LEFT JOIN tickets t ON t.hashed_token = i.hashed_token WHERE t.hashed_token IS NULL"
+                ).fetchall()
+                changed = self._conn.execute(
+                    f"SELECT {', '.join(f'i.{name}' for name in FIELDNAMES[:-1])}, {estado} FROM temp.incoming i "
+                    f"JOIN tickets t ON t.hashed_token = i.hashed_token WHERE {differs}"
+                ).fetchall()
+                removed = self._conn.execute(
+                    "SELECT hashed_token FROM tickets WHERE hashed_token NOT IN (SELECT hashed_token FROM temp.incoming)"
+                ).fetchall()
+                total = self._conn.execute("SELECT COUNT(*) FROM temp.incoming").fetchone()[0]
+            finally:
+                self._conn.execute("DROP TABLE IF EXISTS temp.incoming")
+                self._conn.commit()
+        return {
+            "added": [list(row) for row in added],
+            "changed": [list(row) for row in changed],
+            "removed": [row[0] for row in removed],
+            "unchanged": total - len(added) - len(changed),
+        }
+
+    def apply_diff(self, diff):
+        """Apply a diff_rows() result: index only the changed rows, then rewrite tickets.csv once.
+
+        Added and changed tickets enter the change feed, so delta sync pushes
+        only them. Check-ins are kept: "invalido" is never overwritten, and
+        journaled check-ins are replayed on top of the new contents.
+        """
+        upserts = diff["added"] + diff["changed"]
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            with self._conn:
+                self._conn.executemany(UPSERT_KEEP_CHECKIN, upserts)
+                self._conn.executemany("DELETE FROM tickets WHERE hashed_token = ?", ((t,) for t in diff["removed"]))
+                self._conn.executemany("INSERT INTO changes (hashed_token, kind) VALUES (?, 'row')", ((row[0],) for row in upserts))
+                self._set_meta("journal_offset", "0")
+            self._refresh_locked()
+            self._compact_locked()
+
+    def compact(self):
+        """Fold journaled check-ins into tickets.csv and empty the journal."""
+        with self._lock, self.journal.locked():
+            self._refresh_locked()
+            if self.journal.size():
+                self._compact_locked()
+
+    def _compact_locked(self):
+        self.export_csv(self.csv_file)
+        self.journal.truncate()
+        with self._conn:
+            self._set_meta("journal_offset", "0")
+
+
+def replace_atomically(path, write):
+    """Call write(temp_path) and swap the result in with os.replace.
+
+    The temp file lives next to path, so readers see either the old or the
+    new file, never a partial one.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        os.chmod(temp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        write(temp_path)
+        with open(temp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(csv_file="tickets.csv"):
+    """Return the process-wide TicketStore for a CSV file."""
+    key = os.path.abspath(csv_file)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = TicketStore(csv_file)
+        return _stores[key]
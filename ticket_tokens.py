@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import hmac
+import os
+import struct
+from datetime import date as _date, timedelta
+
+# Token formats printed in the QR code:
+#   "hex": legacy sha256(token_id) as 64 lowercase hex chars (byte mode, QR version 5)
+#   "T1":  "T1" + 24 base32 chars of a truncated HMAC-SHA256 of token_id. Only
+#          uses QR alphanumeric characters, so it fits a version 2 code.
+#   "S1":  signed, self-verifying: "S1" + base32 of the ticket claims (event,
+#          date, adults, children) and an HMAC over them. A gate holding
+#          TICKET_TOKEN_KEY checks it with no lookup (QR version 4).
+COMPACT_PREFIX = "T1"
+COMPACT_MAC_BYTES = 15  # 120 bits -> 24 base32 chars, no padding
+SIGNED_PREFIX = "S1"
+SIGNED_MAC_BYTES = 12
+SIGNED_ID_BYTES = 8
+# id, days since SIGNED_EPOCH, adults, children; the event name (UTF-8) follows
+_SIGNED_HEADER = struct.Struct(">8sHBB")
+SIGNED_EPOCH = _date(2000, 1, 1)
+# Largest claims the header can carry
+SIGNED_MAX_PEOPLE = 255
+SIGNED_LAST_DATE = SIGNED_EPOCH + timedelta(days=0xFFFF)
+TOKEN_FORMAT = os.environ.get("TICKET_TOKEN_FORMAT", "compact")  # "compact", "signed" or "hex"
+
+
+def _token_key():
+    return os.environ.get("TICKET_TOKEN_KEY", "").encode("utf-8")
+
+
+def has_token_key():
+    return bool(_token_key())
+
+
+def signing_enabled():
+    """S1 tickets are issued and accepted only with TICKET_TOKEN_FORMAT=signed and a TICKET_TOKEN_KEY."""
+    return TOKEN_FORMAT == "signed" and has_token_key()
+
+
+def hex_token(token_id):
+    return hashlib.sha256(token_id.encode()).hexdigest()
+
+
+def compact_token(token_id, key=None):
+    mac = hmac.new(_token_key() if key is None else key, token_id.encode(), hashlib.sha256).digest()
+    return COMPACT_PREFIX + base64.b32encode(mac[:COMPACT_MAC_BYTES]).decode("ascii")
+
+
+def _b32encode(data):
+    return base64.b32encode(data).decode("ascii").rstrip("=")
+
+
+def _b32decode(text):
+    return base64.b32decode(text + "=" * (-len(text) % 8))
+
+
+def signed_token(token_id, event_type, date, adults, children, key=None):
+    """Return an "S1" token carrying the ticket claims and their HMAC."""
+    key = _token_key() if key is None else key
+    if not key:
+        raise ValueError("Signed tickets need TICKET_TOKEN_KEY.")
+    adults, children = int(adults), int(children)
+    if not (0 <= adults <= SIGNED_MAX_PEOPLE and 0 <= children <= SIGNED_MAX_PEOPLE):
+        raise ValueError(f"Signed tickets hold at most {SIGNED_MAX_PEOPLE} adults and {SIGNED_MAX_PEOPLE} children.")
+    if not SIGNED_EPOCH <= _date.fromisoformat(date) <= SIGNED_LAST_DATE:
+        raise ValueError(f"Signed tickets need a date between {SIGNED_EPOCH} and {SIGNED_LAST_DATE}.")
+    days = (_date.fromisoformat(date) - SIGNED_EPOCH).days
+    ticket_id = hashlib.sha256(token_id.encode()).digest()[:SIGNED_ID_BYTES]
+    body = _SIGNED_HEADER.pack(ticket_id, days, adults, children) + event_type.encode("utf-8")
+    mac = hmac.new(key, body, hashlib.sha256).digest()
+    return SIGNED_PREFIX + _b32encode(body + mac[:SIGNED_MAC_BYTES])
+
+
+def verify_signed(token, key=None):
+    """Return the claims of a genuine "S1" token, or None.
+
+    Pure CPU work: the HMAC is recomputed from the payload, nothing is looked
+    up. Whether the ticket was already used is up to the caller. Without a
+    key nothing verifies, since anyone could sign with an empty one.
+    """
+    key = _token_key() if key is None else key
+    token = normalize_token(token)
+    if not key or not token.startswith(SIGNED_PREFIX):
+        return None
+    try:
+        data = _b32decode(token[len(SIGNED_PREFIX):])
+    except ValueError:
+        return None
+    body, mac = data[:-SIGNED_MAC_BYTES], data[-SIGNED_MAC_BYTES:]
+    if len(body) < _SIGNED_HEADER.size:
+        return None
+    expected = hmac.new(key, body, hashlib.sha256).digest()[:SIGNED_MAC_BYTES]
+    if not hmac.compare_digest(mac, expected):
+        return None
+    _, days, adults, children = _SIGNED_HEADER.unpack_from(body)
+    return {
+        "event_type": body[_SIGNED_HEADER.size:].decode("utf-8", "replace"),
+        "date": (SIGNED_EPOCH + timedelta(days=days)).isoformat(),
+        "adults": adults,
+        "children": children,
+    }
+
+
+def is_signed(token):
+    return normalize_token(token).startswith(SIGNED_PREFIX)
+
+
+def new_token(token_id, token_format=None, event_type=None, date=None, adults=0, children=0):
+    """Return the QR payload (stored as hashed_token) for a token_id.
+
+    The ticket claims are only needed for the "signed" format.
+    """
+    token_format = token_format or TOKEN_FORMAT
+    if token_format == "hex":
+        return hex_token(token_id)
+    if token_format == "signed":
+        return signed_token(token_id, event_type, date, adults, children)
+    return compact_token(token_id)
+
+
+def normalize_token(token):
+    """Canonical form of a scanned or typed token so both formats match the store."""
+    token = (token or "").strip()
+    if token[:2].upper() in (COMPACT_PREFIX, SIGNED_PREFIX):
+        return token.upper()
+    if len(token) == 64:
+        return token.lower()
+    return token
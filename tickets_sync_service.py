@@ -1,110 +1,365 @@
 import os
+import io
 import json
 import csv
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2 import service_account
+import heapq
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from metrics import increment, timed
+from ticket_snapshot import refresh_snapshot
+from ticket_store import get_store, replace_atomically
+from storage_backends import get_backend
 
 
 load_dotenv()
-# Build creds_info from individual env vars (for TOML or .env with flat keys)
-creds_info = {
-    "type": os.environ.get("type"),
-    "project_id": os.environ.get("project_id"),
-    "private_key_id": os.environ.get("private_key_id"),
-    "private_key": os.environ.get("private_key"),
-    "client_email": os.environ.get("client_email"),
-    "client_id": os.environ.get("client_id"),
-    "auth_uri": os.environ.get("auth_uri"),
-    "token_uri": os.environ.get("token_uri"),
-    "auth_provider_x509_cert_url": os.environ.get("auth_provider_x509_cert_url"),
-    "client_x509_cert_url": os.environ.get("client_x509_cert_url"),
-    "universe_domain": os.environ.get("universe_domain"),
-}
 # Load variables from environment (or st.secrets, if in Streamlit Cloud)
 REMOTE_CSV_ID = os.environ.get("REMOTE_CSV_ID")
 LOCAL_CSV_ID = os.environ.get("LOCAL_CSV_ID", "tickets.csv")  # fallback default
-SCOPES = ["https://www.googleapis.com/auth/drive"]
+# Remote folder holding small delta CSVs; when unset, sync falls back to full upload/download
+REMOTE_DELTA_FOLDER_ID = os.environ.get("REMOTE_DELTA_FOLDER_ID")
+# A delta file can be listed with a createdTime older than files already pulled:
+# the time is taken when the upload starts, and device clocks drift. Each pull
+# lists this many seconds behind its watermark and skips the ids it has seen.
+REMOTE_DELTA_MARGIN = float(os.environ.get("REMOTE_DELTA_MARGIN", "600"))
 
-credentials = service_account.Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+def read_csv_header(path):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f, delimiter=";"), [])
+
+def write_csv_rows(path, header, rows):
+    """Write header + rows (any iterable, e.g. a merge generator) and swap the file in atomically."""
+    def write(temp_path):
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(header)
+            writer.writerows(rows)
+    replace_atomically(path, write)
+
+def download_remote_csv(temp_path, remote_file_id=REMOTE_CSV_ID, backend=None):
+    (backend or get_backend()).download(remote_file_id, temp_path)
+
+def is_redeemed(row, estado_idx):
+    return len(row) > estado_idx and row[estado_idx] == "invalido"
 
-# Setup Drive client
-service = build("drive", "v3", credentials=credentials)
+# Rows held in memory per sorted run during a merge
+MERGE_RUN_ROWS = 50000
 
-def read_csv_rows(path):
-    if not os.path.exists(path):
-        return [], []
+def _write_sorted_runs(path, token_idx, run_dir, prefix):
+    """Split a CSV (minus header) into files of at most MERGE_RUN_ROWS rows sorted by token."""
+    runs = []
+    if not path or not os.path.exists(path):
+        return runs
     with open(path, newline="", encoding="utf-8") as f:
         reader = csv.reader(f, delimiter=";")
-        rows = list(reader)
-        if not rows:
-            return [], []
-        return rows[0], rows[1:]
+        next(reader, None)
+        while True:
+            chunk = [row for _, row in zip(range(MERGE_RUN_ROWS), reader) if len(row) > token_idx]
+            if not chunk:
+                break
+            chunk.sort(key=lambda row: row[token_idx])  # stable: later duplicates stay later
+            run_path = os.path.join(run_dir, f"{prefix}_{len(runs)}.csv")
+            with open(run_path, "w", newline="", encoding="utf-8") as run_file:
+                csv.writer(run_file, delimiter=";").writerows(chunk)
+            runs.append(run_path)
+    return runs
 
-def write_csv_rows(path, header, rows):
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f, delimiter=";")
-        writer.writerow(header)
-        writer.writerows(rows)
-
-def download_remote_csv(temp_path, remote_file_id=REMOTE_CSV_ID):
-    file_data = service.files().get_media(fileId=remote_file_id).execute()
-    with open(temp_path, "wb") as f:
-        f.write(file_data)
-
-def safe_merge_csv(local_path=LOCAL_CSV_ID, remote_file_id=REMOTE_CSV_ID):
-    # Download remote to temp
+def _read_run(run_path, token_idx, rank):
+    with open(run_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f, delimiter=";"):
+            yield row[token_idx], rank, row
+
+def _merge_runs(runs, token_idx, estado_idx, run_dir):
+    """Yield one row per hashed_token, in token order, from the sorted runs.
+
+    Runs are ranked remote first, then local, so the last row of each group
+    wins (local takes precedence), except that a check-in is never undone.
+    """
+    try:
+        streams = [_read_run(path, token_idx, rank) for rank, path in enumerate(runs)]
+        merged = heapq.merge(*streams, key=lambda item: (item[0], item[1]))
+        for _, group in itertools.groupby(merged, key=lambda item: item[0]):
+            rows = [row for _, _, row in group]
+            row = rows[-1]
+            if estado_idx is not None and not is_redeemed(row, estado_idx):
+                redeemed = next((r for r in rows if is_redeemed(r, estado_idx)), None)
+                if redeemed:
+                    row[estado_idx] = redeemed[estado_idx]
+            yield row
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def _fetch_remote(local_path, remote_file_id, backend):
+    # Download remote to temp (streamed to disk in chunks); None if it does not exist yet
     temp_remote = local_path + ".remote"
     try:
-        download_remote_csv(temp_remote, remote_file_id)
+        download_remote_csv(temp_remote, remote_file_id, backend)
     except Exception:
-        temp_remote = None  # Remote may not exist yet
+        return None
+    return temp_remote
+
+def safe_merge_csv(local_path=LOCAL_CSV_ID, remote_file_id=REMOTE_CSV_ID, backend=None, remote_path=None):
+    """Merge local and remote CSVs by hashed_token with bounded memory.
+
+    Returns (header, rows) where rows is a generator meant to be passed
+    straight to write_csv_rows. Both inputs are fully split into sorted runs
+    on disk before returning, so the generator may overwrite local_path.
+    remote_path is an already downloaded remote copy; it is removed afterwards.
+    """
+    temp_remote = remote_path or _fetch_remote(local_path, remote_file_id, backend)
+
+    try:
+        # Use local header if present, else remote
+        header = read_csv_header(local_path) or read_csv_header(temp_remote)
+        if not header:
+            return header, iter(())  # No data to merge
 
-    # Read both CSVs
-    local_header, local_rows = read_csv_rows(local_path)
-    remote_header, remote_rows = read_csv_rows(temp_remote) if temp_remote else ([], [])
+        # Find the index of the hashed_token column
+        try:
+            token_idx = header.index("hashed_token")
+        except ValueError:
+            raise ValueError("CSV must have a 'hashed_token' column in the header.")
+        estado_idx = header.index("estado") if "estado" in header else None
 
-    # Use local header if present, else remote
-    header = local_header or remote_header
-    if not header:
-        return header, []  # No data to merge
+        run_dir = tempfile.mkdtemp(prefix="tickets_merge_", dir=os.path.dirname(os.path.abspath(local_path)))
+        try:
+            runs = _write_sorted_runs(temp_remote, token_idx, run_dir, "remote")
+            runs += _write_sorted_runs(local_path, token_idx, run_dir, "local")
+        except Exception:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            raise
+        return header, _merge_runs(runs, token_idx, estado_idx, run_dir)
+    finally:
+        # Clean up temp file
+        if temp_remote and os.path.exists(temp_remote):
+            os.remove(temp_remote)
+
+def _merge_into_local(local_path, remote_file_id, backend):
+    # The download happens before taking the store's writer lock so sales and
+    # check-ins only wait for the local merge, not for the network
+    store = get_store(local_path)
+    remote_path = _fetch_remote(local_path, remote_file_id, backend)
+
+    def write(temp_path):
+        header, merged_rows = safe_merge_csv(local_path, remote_file_id, backend, remote_path=remote_path)
+        if not header:
+            raise ValueError("No header found in either local or remote CSV.")
+        write_csv_rows(temp_path, header, merged_rows)
+
+    try:
+        store.rewrite_csv(write)
+    finally:
+        if remote_path and os.path.exists(remote_path):
+            os.remove(remote_path)
+    return store
 
-    # Find the index of the hashed_token column
+@timed("sync_upload_csv")
+def upload_csv(local_path=LOCAL_CSV_ID, remote_file_id=REMOTE_CSV_ID, backend=None):
+    """Safely merge and upload local and remote CSVs to the remote storage."""
+    get_store(local_path).compact()  # fold pending check-ins into the CSV first
+    store = _merge_into_local(local_path, remote_file_id, backend)
+    fd, snapshot = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
     try:
-        token_idx = header.index("hashed_token")
-    except ValueError:
-        raise ValueError("CSV must have a 'hashed_token' column in the header.")
-
-    # Build dicts keyed by hashed_token
-    merged_dict = {}
-    for row in remote_rows:
-        if len(row) > token_idx:
-            merged_dict[row[token_idx]] = row
-    for row in local_rows:
-        if len(row) > token_idx:
-            merged_dict[row[token_idx]] = row  # Local takes precedence
-
-    merged_rows = [merged_dict[key] for key in sorted(merged_dict.keys())]
-
-    # Clean up temp file
-    if temp_remote and os.path.exists(temp_remote):
-        os.remove(temp_remote)
-
-    return header, merged_rows
-
-def upload_csv(local_path=LOCAL_CSV_ID, remote_file_id=REMOTE_CSV_ID):
-    """Safely merge and upload local and remote CSVs to Google Drive."""
-    header, merged_rows = safe_merge_csv(local_path, remote_file_id)
-    if not header:
-        raise ValueError("No header found in either local or remote CSV.")
-    write_csv_rows(local_path, header, merged_rows)
-    media = MediaFileUpload(local_path, mimetype="text/csv")
-    service.files().update(fileId=remote_file_id, media_body=media).execute()
-
-def download_csv(local_path=LOCAL_CSV_ID, remote_file_id=REMOTE_CSV_ID):
+        store.snapshot_csv(snapshot)
+        (backend or get_backend()).update(remote_file_id, snapshot)
+    finally:
+        os.remove(snapshot)
+
+@timed("sync_download_csv")
+def download_csv(local_path=LOCAL_CSV_ID, remote_file_id=REMOTE_CSV_ID, backend=None):
     """Safely merge and save the merged CSV locally."""
-    header, merged_rows = safe_merge_csv(local_path, remote_file_id)
-    if not header:
-        raise ValueError("No header found in either local or remote CSV.")
-    write_csv_rows(local_path, header, merged_rows)
\ No newline at end of file
+    _merge_into_local(local_path, remote_file_id, backend)
+
+# --- Delta sync ---
+# Every push uploads only the rows changed locally since the last push as a new
+# file in REMOTE_DELTA_FOLDER_ID; every pull downloads only the delta files
+# created after the last one seen (minus REMOTE_DELTA_MARGIN). Watermarks live
+# in the ticket store.
+
+def _rewind(timestamp, seconds):
+    """RFC 3339 UTC timestamp moved back by seconds, to whole seconds ("" stays "")."""
+    if not timestamp:
+        return ""
+    moment = datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S") - timedelta(seconds=seconds)
+    # No fraction or zone: sorts before any createdTime in the same second, as Drive and LocalBackend write them
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+@timed("sync_push_delta")
+def push_delta(local_path=LOCAL_CSV_ID, folder_id=REMOTE_DELTA_FOLDER_ID, backend=None):
+    """Upload the rows changed since the last push. Returns the number of rows sent."""
+    backend = backend or get_backend()
+    store = get_store(local_path)
+    last_seq = int(store.get_meta("delta_push_seq", 0))
+    rows, new_seq = store.changes_since(last_seq)
+    if not rows:
+        store.set_meta("delta_push_seq", str(new_seq))
+        return 0
+    fd, temp_path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        header = list(rows[0].keys())
+        write_csv_rows(temp_path, header, ([row[name] for name in header] for row in rows))
+        created = backend.create(folder_id, f"delta_{new_seq}_{uuid.uuid4().hex}.csv", temp_path)
+    finally:
+        os.remove(temp_path)
+    # Our own delta does not need to be pulled back
+    seen = json.loads(store.get_meta(f"delta_seen:{folder_id}", "{}"))
+    seen[created["id"]] = created["createdTime"]
+    store.set_meta(f"delta_seen:{folder_id}", json.dumps(seen))
+    store.set_meta("delta_push_seq", str(new_seq))
+    return len(rows)
+
+@timed("sync_pull_delta")
+def pull_delta(local_path=LOCAL_CSV_ID, folder_id=REMOTE_DELTA_FOLDER_ID, backend=None):
+    """Download and merge delta files created since the last pull. Returns rows applied."""
+    backend = backend or get_backend()
+    store = get_store(local_path)
+    watermark = store.get_meta(f"delta_pull_watermark:{folder_id}", "")
+    seen = json.loads(store.get_meta(f"delta_seen:{folder_id}", "{}"))  # file id -> createdTime
+    # Files can share a createdTime or be listed late; seen ids filter repeats
+    files = backend.list_since(folder_id, _rewind(watermark, REMOTE_DELTA_MARGIN))
+
+    applied = 0
+    for file in files:
+        if file["id"] not in seen:
+            data = backend.read(file["id"])
+            rows = list(csv.DictReader(io.StringIO(data.decode("utf-8")), delimiter=";"))
+            applied += store.merge_rows(rows)
+        seen[file["id"]] = file["createdTime"]
+        watermark = max(watermark, file["createdTime"])
+    # Only ids the next listing can return are needed to skip repeats
+    since = _rewind(watermark, REMOTE_DELTA_MARGIN)
+    seen = {file_id: created for file_id, created in seen.items() if created >= since}
+    store.set_meta(f"delta_pull_watermark:{folder_id}", watermark)
+    store.set_meta(f"delta_seen:{folder_id}", json.dumps(seen))
+    return applied
+
+def sync_delta(local_path=LOCAL_CSV_ID, folder_id=REMOTE_DELTA_FOLDER_ID, backend=None, push=True, pull=True):
+    """Exchange only changed rows with the remote; falls back to a full sync without a delta folder."""
+    if not folder_id:
+        if push:
+            upload_csv(local_path, backend=backend)
+        elif pull:
+            download_csv(local_path, backend=backend)
+    else:
+        if pull:
+            pull_delta(local_path, folder_id, backend)
+        if push:
+            push_delta(local_path, folder_id, backend)
+    # Keep the columnar snapshot roughly current for bulk readers
+    refresh_snapshot(local_path)
+
+# --- Background sync ---
+
+class SyncWorker:
+    """Runs sync_delta on a background thread so the UI never waits on Drive.
+
+    Requests made while a sync is pending are coalesced into one run; failed
+    runs are retried with exponential backoff.
+    """
+
+    def __init__(self, local_path=LOCAL_CSV_ID, sync_fn=None, debounce=0.5, base_backoff=2.0, max_backoff=300.0):
+        self.local_path = local_path
+        self.sync_fn = sync_fn or sync_delta
+        self.debounce = debounce
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._push = False
+        self._pull = False
+        self._requested_at = None  # oldest request not yet picked up
+        self._inflight_since = None  # oldest request covered by the running sync
+        self._running = False
+        self._stopped = False
+        self._last_success = None
+        self._last_error = None
+        self._failures = 0
+        self._thread = threading.Thread(target=self._run, name="tickets-sync", daemon=True)
+        self._thread.start()
+
+    def request_sync(self, push=True, pull=True):
+        with self._cond:
+            self._push = self._push or push
+            self._pull = self._pull or pull
+            if self._requested_at is None:
+                self._requested_at = time.time()
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            now = time.time()
+            oldest = min((t for t in (self._inflight_since, self._requested_at) if t), default=None)
+            return {
+                "pending": self._push or self._pull,
+                "running": self._running,
+                "last_success": self._last_success,
+                "last_error": self._last_error,
+                "failures": self._failures,
+                "lag_seconds": now - oldest if oldest else 0.0,
+            }
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._push or self._pull) and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            # Let a burst of requests collapse into a single sync
+            time.sleep(self.debounce)
+            with self._cond:
+                push, pull = self._push, self._pull
+                self._push = self._pull = False
+                self._inflight_since = self._requested_at
+                self._requested_at = None
+                self._running = True
+            try:
+                self.sync_fn(self.local_path, push=push, pull=pull)
+            except Exception as e:
+                print(f"[TicketsSync] Sync failed: {e}")
+                increment("sync_failures")
+                with self._cond:
+                    self._running = False
+                    self._last_error = str(e)
+                    self._failures += 1
+                    self._push = self._push or push
+                    self._pull = self._pull or pull
+                    self._requested_at = min(t for t in (self._inflight_since, self._requested_at) if t)
+                    self._inflight_since = None
+                    delay = min(self.max_backoff, self.base_backoff * 2 ** (self._failures - 1))
+                    deadline = time.time() + delay
+                    # New requests do not cut the backoff short; stop() does
+                    while not self._stopped and time.time() < deadline:
+                        self._cond.wait(deadline - time.time())
+                continue
+            with self._cond:
+                self._running = False
+                self._last_success = time.time()
+                self._last_error = None
+                self._failures = 0
+                self._inflight_since = None
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+def get_sync_worker(local_path=LOCAL_CSV_ID):
+    """Return the process-wide SyncWorker for a local CSV."""
+    key = os.path.abspath(local_path)
+    with _workers_lock:
+        if key not in _workers:
+            _workers[key] = SyncWorker(local_path)
+        return _workers[key]